@@ -11,8 +11,8 @@ Retrieval-Augmented Generation pipeline by:
     response.
 """
 
-from retriever import query_vector_store
-from utils.llm import get_response, llm, embedding_model
+from retriever import retrieve_context
+from utils.llm import get_routed_response
 import os
 from dotenv import load_dotenv
 
@@ -54,22 +54,21 @@ USER REQUEST:
 """
     return prompt_template
 
-def run_agent(user_prompt: str):
+def run_agent(user_prompt: str, where: dict = None):
     """
     Runs the full RAG pipeline.
 
     Args:
         user_prompt: The user's question or task.
+        where: Optional metadata filter for retrieval, e.g. built with
+            `retriever.build_where(content_type="table")`.
     """
     print(f"--- Running Agent for Prompt: '{user_prompt}' ---")
 
-    # 1. Retrieve context from the vector store
+    # 1. Retrieve context from the vector store (summaries for broad prompts)
     # Note: With mock embeddings, this context will be random.
-    retrieved_results = query_vector_store(query=user_prompt, n_results=3)
-    
-    retrieved_docs = []
-    if retrieved_results and retrieved_results.get('documents'):
-        retrieved_docs = retrieved_results['documents'][0]
+    retrieved_docs = retrieve_context(query=user_prompt, n_results=3, where=where)
+    if retrieved_docs:
         print(f"Successfully retrieved {len(retrieved_docs)} context documents.")
     else:
         print("Warning: Could not retrieve any context from the vector store.")
@@ -81,7 +80,7 @@ def run_agent(user_prompt: str):
 
     # 3. Get the final response from the LLM
     print("\n--- Getting Final Response from LLM ---")
-    final_response = get_response(user_prompt=enhanced_prompt, llm=llm)
+    final_response = get_routed_response(enhanced_prompt, routing_text=user_prompt)
 
     # 4. Print the final answer
     print("\n--- AGENT'S FINAL RESPONSE ---")
@@ -0,0 +1,134 @@
+"""
+benchmark_llm_router.py
+
+Compares single-model LLM calls with the tiered router in `utils/llm.py`
+against the local fake API in `fake_llm_server.py`, so p95 improvements can
+be confirmed without real OpenAI traffic. It:
+1.  Starts `fake_llm_server.py` on a free port with the given latency,
+    tail-latency and error settings, and points the OpenAI clients at it.
+2.  Sends a mix of lookup, analysis and user-story prompts from concurrent
+    client threads, once through `get_response` (the single default model)
+    and once through `get_routed_response` (with an optional deadline and
+    hedge delay).
+3.  Reports p50/p95 latency, failures and the median length of the user
+    stories (the long-form answers) for each mode, plus the router's per-tier
+    calls, fallbacks, probes, latency, expected latency and token usage.
+
+Usage:
+    python benchmark_llm_router.py --requests 200 --tail-rate 0.05 --tail-latency 3 --hedge 1.5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_serving import _free_port, _wait_ready
+
+FAKE_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_llm_server.py")
+
+PROMPTS = [
+    "What was ING's CET1 ratio in 3Q2023?",
+    "Which segment had the highest net interest income?",
+    "How did ING Group's net interest income and cost/income ratio change between 3Q2022 and 3Q2023 "
+    "across Retail Banking, Wholesale Banking and the Corporate Line, and what might explain these differences?",
+    "Based on the financial data, create a user story with acceptance criteria for a feature that helps "
+    "financial analysts track quarterly performance.",
+]
+
+
+def _percentile(ordered, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000 if ordered else float("nan")
+
+
+def run_mode(call, prompts, concurrency: int) -> dict:
+    from utils.llm import FAILED_RESPONSE, LONG_OUTPUT_PATTERN
+
+    def timed(prompt: str):
+        start = time.perf_counter()
+        response = call(prompt)
+        return time.perf_counter() - start, response
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, prompts))
+    latencies = sorted(elapsed for elapsed, _ in results)
+    story_words = sorted(
+        len(response.split()) - 1 for prompt, (_, response) in zip(prompts, results)
+        if LONG_OUTPUT_PATTERN.search(prompt) and response != FAILED_RESPONSE
+    )
+    return {
+        "p50_ms": _percentile(latencies, 0.50),
+        "p95_ms": _percentile(latencies, 0.95),
+        "max_ms": latencies[-1] * 1000,
+        "failures": sum(1 for _, response in results if response == FAILED_RESPONSE),
+        # The fake server answers with one word per completion token.
+        "story_words": story_words[len(story_words) // 2] if story_words else float("nan"),
+    }
+
+
+def run(args) -> None:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = [
+        sys.executable, FAKE_SERVER_SCRIPT, "--port", str(port),
+        "--model-latency", *args.model_latency,
+        "--token-latency", str(args.token_latency),
+        "--tail-rate", str(args.tail_rate), "--tail-latency", str(args.tail_latency),
+        "--error-rate", str(args.error_rate), "--seed", "1",
+    ]
+    proc = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        _wait_ready(base_url)
+
+        # Configure the clients before `utils.llm` creates them.
+        os.environ["OPENAI_API_KEY"] = "fake"
+        os.environ["OPENAI_BASE_URL"] = os.environ["OPENAI_API_BASE"] = f"{base_url}/v1"
+        os.environ["OPENAI_RATE_LIMIT_STATE"] = os.path.join(tempfile.mkdtemp(prefix="router_bench_"), "state.json")
+        os.environ.setdefault("OPENAI_CHAT_RPM", "1000000")
+        os.environ.setdefault("OPENAI_CHAT_TPM", "100000000")
+        from utils.llm import get_response, get_routed_response, tier_stats
+
+        # Unique prompts, so in-flight coalescing does not merge requests.
+        prompts = [f"{PROMPTS[i % len(PROMPTS)]} (request {i})" for i in range(args.requests)]
+        modes = {
+            "single model": lambda prompt: get_response(user_prompt=prompt),
+            "routed": lambda prompt: get_routed_response(prompt, deadline_s=args.deadline, hedge_s=args.hedge),
+        }
+        print(f"{args.requests} requests, concurrency {args.concurrency}, "
+              f"deadline {args.deadline or 'none'} s, hedge {args.hedge or 'none'} s.")
+        print(f"\n{'mode':<14}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'failures':>10}{'story words':>13}")
+        for name, call in modes.items():
+            result = run_mode(call, prompts, args.concurrency)
+            print(f"{name:<14}{result['p50_ms']:>10.0f}{result['p95_ms']:>10.0f}{result['max_ms']:>10.0f}"
+                  f"{result['failures']:>10}{result['story_words']:>13.0f}")
+
+        print(f"\n{'tier':<9}{'model':<16}{'calls':>7}{'served':>8}{'fallbk':>8}{'probes':>8}{'failed':>8}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'exp ms':>9}{'prompt tok':>12}{'compl tok':>11}")
+        for tier, stats in tier_stats().items():
+            p50 = (stats["p50_latency_s"] or float("nan")) * 1000
+            p95 = (stats["p95_latency_s"] or float("nan")) * 1000
+            print(f"{tier:<9}{stats['model']:<16}{stats['calls']:>7}{stats['served']:>8}{stats['fallbacks']:>8}"
+                  f"{stats['probes']:>8}{stats['failures']:>8}{p50:>9.0f}{p95:>9.0f}{stats['expected_latency_s'] * 1000:>9.0f}"
+                  f"{stats['prompt_tokens']:>12}{stats['completion_tokens']:>11}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tiered LLM router against a fake LLM server.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--deadline", type=float, default=None, help="Per-request latency budget in seconds.")
+    parser.add_argument("--hedge", type=float, default=None, help="Seconds before starting the fallback tier.")
+    parser.add_argument("--model-latency", nargs="+", default=["gpt-3.5-turbo=0.3", "gpt-4o-mini=0.6"],
+                        metavar="MODEL=SECONDS", help="Base latency per model on the fake server.")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Fake server seconds per completion token.")
+    parser.add_argument("--tail-rate", type=float, default=0.05, help="Fraction of fake responses that are slow.")
+    parser.add_argument("--tail-latency", type=float, default=3.0, help="Extra seconds for a slow fake response.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of fake responses that fail.")
+    args = parser.parse_args()
+
+    run(args)
@@ -0,0 +1,138 @@
+"""
+benchmark_serving.py
+
+Measures how the API scales across worker processes when run with
+`serve.py`. For each worker count it:
+1.  Starts `serve.py` on a free port and waits until it answers.
+2.  Samples `GET /stats` until every worker has reported, and records each
+    worker's RSS, shared and private memory.
+3.  Sends requests to an endpoint (default: `POST /retrieve`) from a pool of
+    concurrent client threads for a fixed duration and reports requests/sec
+    and latency percentiles.
+
+Note: `/retrieve` embeds the query, so it needs a working embeddings
+endpoint (e.g. `OPENAI_API_KEY`, or `OPENAI_BASE_URL` pointing at a local
+fake server).
+
+Usage:
+    VECTOR_STORE_BACKEND=mmap python benchmark_serving.py --workers 1 2 4 --duration 15
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SERVE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(url: str, payload=None, timeout: float = 60.0) -> bytes:
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read()
+
+
+def _wait_ready(base_url: str, timeout: float = 120.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            _request(f"{base_url}/stats", timeout=2)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become ready in {timeout}s")
+
+
+def worker_memory(base_url: str, workers: int, attempts: int = 200) -> dict:
+    """Samples /stats until `workers` distinct pids have answered."""
+    seen = {}
+    for _ in range(attempts):
+        stats = json.loads(_request(f"{base_url}/stats"))
+        seen[stats["memory_kb"]["pid"]] = stats["memory_kb"]
+        if len(seen) >= workers:
+            break
+    return seen
+
+
+def load_test(base_url: str, path: str, payload: dict, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client() -> None:
+        nonlocal errors
+        while time.time() < stop_at:
+            start = time.perf_counter()
+            try:
+                _request(f"{base_url}{path}", payload)
+                ok = True
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+    return {
+        "rps": len(latencies) / duration,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "errors": errors,
+    }
+
+
+def run(worker_counts, path: str, prompt: str, concurrency: int, duration: float) -> None:
+    payload = {"prompt": prompt}
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}"
+          f"{'rss MB/w':>10}{'shared MB/w':>13}{'private MB/w':>14}")
+    for workers in worker_counts:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        proc = subprocess.Popen(
+            [sys.executable, SERVE_SCRIPT, "--workers", str(workers), "--port", str(port)],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(base_url)
+            memory = worker_memory(base_url, workers)
+            result = load_test(base_url, path, payload, concurrency or 4 * workers, duration)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+        n = max(len(memory), 1)
+        avg = lambda field: sum(m[field] for m in memory.values()) / n / 1024
+        print(f"{workers:>8}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['errors']:>8}{avg('rss'):>10.1f}{avg('shared'):>13.1f}{avg('private'):>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark requests/sec scaling of serve.py across workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/retrieve", help="Endpoint to load-test.")
+    parser.add_argument("--prompt", default="What were the net profits for the last quarter?")
+    parser.add_argument("--concurrency", type=int, default=0, help="Client threads (default: 4 per worker).")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to load-test each configuration.")
+    args = parser.parse_args()
+
+    run(args.workers, args.path, args.prompt, args.concurrency, args.duration)
@@ -0,0 +1,186 @@
+"""
+benchmark_vector_store.py
+
+Compares the vector-store backends in `utils/vector_store.py` on the same
+data. For each backend it reports:
+1.  Cold load time (opening the collection in a fresh process).
+2.  Query latency (p50 / p95) for single-vector queries.
+3.  Recall@k against an exact float32 brute-force search.
+4.  Resident memory (RSS) of the querying process, and how much of it is
+    private to that process rather than shared through the page cache.
+
+By default the embeddings are read from the collection created by
+`ingest.py`, through the configured backend (`VECTOR_STORE_BACKEND`,
+`VECTOR_STORE_SHARD_BY`, `VECTOR_STORE_COLLECTION`). Use `--synthetic N` to benchmark on N random vectors
+instead (no database or API key required), and `--shards N` to build each
+backend as N hash shards queried with scatter-gather.
+
+Usage:
+    python benchmark_vector_store.py --queries 200 --k 5
+    python benchmark_vector_store.py --synthetic 200000 --dim 1536
+    python benchmark_vector_store.py --synthetic 200000 --dim 1536 --shards 8
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from utils.metrics import process_memory_kb
+from utils.vector_store import (
+    COLLECTION_NAME,
+    ChromaVectorStore,
+    CollectionNotFoundError,
+    MmapVectorStore,
+    ShardedVectorStore,
+    get_vector_store,
+)
+
+BENCH_COLLECTION_NAME = "bench_collection"
+ADD_BATCH_SIZE = 5000
+
+
+def load_source_data(synthetic: int, dim: int):
+    """Loads (ids, embeddings, documents, metadatas) to benchmark on."""
+    if synthetic:
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((synthetic, dim)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        ids = [f"doc_{i}" for i in range(synthetic)]
+        documents = [f"Synthetic document {i}" for i in range(synthetic)]
+        metadatas = [{"source": "synthetic", "content_type": "text"} for _ in range(synthetic)]
+        return ids, embeddings, documents, metadatas
+
+    # Read through the configured backend, sharding and collection name, so
+    # the data is found wherever `ingest.py` put it.
+    try:
+        store = get_vector_store(COLLECTION_NAME)
+    except CollectionNotFoundError as e:
+        print(f"Could not open the ingested collection: {e}")
+        return [], np.empty((0, dim), dtype=np.float32), [], []
+    ids, blocks, documents, metadatas = [], [], [], []
+    for batch in store.iter_batches():
+        ids.extend(batch["ids"])
+        blocks.append(batch["embeddings"])
+        documents.extend(batch["documents"])
+        metadatas.extend(batch["metadatas"])
+    embeddings = np.concatenate(blocks) if blocks else np.empty((0, dim), dtype=np.float32)
+    return ids, embeddings, documents, metadatas
+
+
+def open_store(backend: str, path: str, shards: int, create: bool = False):
+    """Opens (or creates) the benchmark collection for `backend`, e.g. "mmap-int8"."""
+    name, _, dtype = backend.partition("-")
+    kwargs = {"dtype": dtype} if create and dtype else {}
+    if shards:
+        return ShardedVectorStore(BENCH_COLLECTION_NAME, backend=name, path=path, create=create,
+                                  shard_by="hash", n_shards=shards, **kwargs)
+    if name == "chroma":
+        return ChromaVectorStore(BENCH_COLLECTION_NAME, path=path, create=create)
+    return MmapVectorStore(BENCH_COLLECTION_NAME, path=path, create=create, **kwargs)
+
+
+def build_store(backend: str, path: str, shards: int, ids, embeddings, documents, metadatas) -> float:
+    """Builds a benchmark collection for `backend` under `path`. Returns build seconds."""
+    start = time.perf_counter()
+    store = open_store(backend, path, shards, create=True)
+
+    for i in range(0, len(ids), ADD_BATCH_SIZE):
+        store.add(
+            ids=list(ids[i:i + ADD_BATCH_SIZE]),
+            embeddings=embeddings[i:i + ADD_BATCH_SIZE].tolist(),
+            documents=list(documents[i:i + ADD_BATCH_SIZE]),
+            metadatas=list(metadatas[i:i + ADD_BATCH_SIZE]),
+        )
+    store.flush()
+    return time.perf_counter() - start
+
+
+def _query_worker(backend: str, path: str, shards: int, queries: np.ndarray, k: int, out: mp.Queue) -> None:
+    """Runs in a fresh process: opens the store cold, queries it, reports stats."""
+    baseline = process_memory_kb()
+
+    start = time.perf_counter()
+    store = open_store(backend, path, shards)
+    load_seconds = time.perf_counter() - start
+
+    latencies, result_ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = store.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies.append(time.perf_counter() - start)
+        result_ids.append(result["ids"][0])
+
+    memory = process_memory_kb()
+    out.put({
+        "load_seconds": load_seconds,
+        "latencies": latencies,
+        "result_ids": result_ids,
+        "rss_kb": memory["rss"] - baseline["rss"],
+        "private_kb": memory["private"] - baseline["private"],
+    })
+
+
+def run_benchmark(synthetic: int, dim: int, n_queries: int, k: int, backends, shards: int = 0) -> None:
+    ids, embeddings, documents, metadatas = load_source_data(synthetic, dim)
+    if len(ids) == 0:
+        print("Error: No embeddings to benchmark. Run 'ingest.py' or pass --synthetic.")
+        return
+    print(f"Benchmarking {len(ids)} vectors of dimension {embeddings.shape[1]}, "
+          f"{n_queries} queries, k={k}" + (f", {shards} shards." if shards else "."))
+
+    # Queries are perturbed copies of stored vectors, so every query has
+    # meaningful near neighbours. Exact float32 search is the recall reference.
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(ids), size=n_queries)
+    queries = embeddings[picks] + 0.05 * rng.standard_normal((n_queries, embeddings.shape[1])).astype(np.float32)
+    sq_norms = (embeddings ** 2).sum(axis=1)
+    truth = []
+    for query in queries:
+        dist = sq_norms - 2.0 * embeddings @ query
+        truth.append({ids[i] for i in np.argsort(dist)[:k]})
+
+    ctx = mp.get_context("spawn")
+    work_dir = tempfile.mkdtemp(prefix="vector_store_bench_")
+    try:
+        print(f"\n{'backend':<14}{'build s':>10}{'load ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'recall':>9}{'disk MB':>10}{'rss MB':>9}{'private MB':>12}")
+        for backend in backends:
+            path = os.path.join(work_dir, backend)
+            build_seconds = build_store(backend, path, shards, ids, embeddings, documents, metadatas)
+
+            out = ctx.Queue()
+            proc = ctx.Process(target=_query_worker, args=(backend, path, shards, queries, k, out))
+            proc.start()
+            stats = out.get()
+            proc.join()
+
+            latencies = np.asarray(stats["latencies"]) * 1000
+            recall = np.mean([len(truth[i] & set(stats["result_ids"][i])) / k for i in range(n_queries)])
+            disk_bytes = sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(path) for name in names
+            )
+            print(f"{backend:<14}{build_seconds:>10.2f}{stats['load_seconds'] * 1000:>10.1f}"
+                  f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}"
+                  f"{recall:>9.3f}{disk_bytes / 1e6:>10.1f}{stats['rss_kb'] / 1024:>9.1f}"
+                  f"{stats['private_kb'] / 1024:>12.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark vector-store backends.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N random vectors instead of the ingested corpus.")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of synthetic vectors.")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries to run.")
+    parser.add_argument("--k", type=int, default=5, help="Number of results per query.")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "mmap-float16", "mmap-int8"],
+                        help="Backends to compare.")
+    parser.add_argument("--shards", type=int, default=0, help="Split each backend into N hash shards.")
+    args = parser.parse_args()
+
+    run_benchmark(args.synthetic, args.dim, args.queries, args.k, args.backends, args.shards)
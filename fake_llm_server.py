@@ -0,0 +1,149 @@
+"""
+fake_llm_server.py
+
+A local stand-in for the OpenAI API, for load-testing the LLM router and
+the serving path without paying for (or being rate-limited by) real calls.
+It implements `POST /v1/chat/completions` and `POST /v1/embeddings` with
+realistic response shapes, `usage` and `x-ratelimit-*` headers.
+
+Latency is simulated per request as:
+    model base latency + completion tokens x per-token latency
+plus, with probability `--tail-rate`, an extra `--tail-latency` seconds (a
+slow replica). With probability `--error-rate` the request fails with a 500.
+The completion length is a fixed fraction of the request's `max_tokens`, so
+tiers with a smaller output budget answer faster, as they would in reality.
+
+Point the app at it with:
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake python main.py
+
+Usage:
+    python fake_llm_server.py --port 8100 --model-latency gpt-3.5-turbo=0.3 gpt-4o-mini=0.8
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections import Counter
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+EMBEDDING_DIMENSION = 1536
+
+app = FastAPI(title="Fake OpenAI API")
+config = {
+    "model_latency": {},
+    "default_latency": 0.3,
+    "token_latency": 0.002,
+    "completion_fraction": 0.6,
+    "tail_rate": 0.0,
+    "tail_latency": 0.0,
+    "error_rate": 0.0,
+}
+_requests = Counter()
+_RATE_LIMIT_HEADERS = {
+    "x-ratelimit-limit-requests": "1000000",
+    "x-ratelimit-remaining-requests": "999999",
+    "x-ratelimit-limit-tokens": "100000000",
+    "x-ratelimit-remaining-tokens": "99999999",
+}
+
+
+def _token_count(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "unknown")
+    _requests[model] += 1
+    prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+    max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or 500
+    completion_tokens = max(1, int(max_tokens * config["completion_fraction"]))
+
+    latency = config["model_latency"].get(model, config["default_latency"]) + completion_tokens * config["token_latency"]
+    if random.random() < config["tail_rate"]:
+        latency += config["tail_latency"]
+    await asyncio.sleep(latency)
+
+    if random.random() < config["error_rate"]:
+        return JSONResponse(status_code=500, content={"error": {"message": "Simulated upstream failure.", "type": "server_error"}})
+
+    prompt_tokens = _token_count(prompt)
+    content = f"[{model}] " + " ".join(["lorem"] * completion_tokens)
+    return JSONResponse(headers=_RATE_LIMIT_HEADERS, content={
+        "id": f"chatcmpl-fake-{_requests[model]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "length",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    })
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    model = body.get("model", "unknown")
+    _requests[model] += 1
+    inputs = body.get("input", [])
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    data = []
+    for i, text in enumerate(inputs):
+        # Deterministic per input, so the same text always embeds the same way.
+        seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(body.get("dimensions") or EMBEDDING_DIMENSION)
+        vector /= np.linalg.norm(vector)
+        data.append({"object": "embedding", "index": i, "embedding": vector.tolist()})
+    tokens = sum(_token_count(str(text)) for text in inputs)
+    return JSONResponse(headers=_RATE_LIMIT_HEADERS, content={
+        "object": "list",
+        "data": data,
+        "model": model,
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+
+@app.get("/stats")
+def stats():
+    """Requests received per model."""
+    return {"requests": dict(_requests), "config": config}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible API with simulated latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--model-latency", nargs="*", default=[], metavar="MODEL=SECONDS",
+                        help="Base latency per model, e.g. gpt-3.5-turbo=0.3.")
+    parser.add_argument("--default-latency", type=float, default=0.3, help="Base latency for other models.")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Seconds per completion token.")
+    parser.add_argument("--completion-fraction", type=float, default=0.6, help="Completion length as a fraction of max_tokens.")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Probability of a slow response.")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="Extra seconds for a slow response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 500 error.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for spec in args.model_latency:
+        model, _, seconds = spec.partition("=")
+        config["model_latency"][model] = float(seconds)
+    for key in ("default_latency", "token_latency", "completion_fraction", "tail_rate", "tail_latency", "error_rate"):
+        config[key] = getattr(args, key)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
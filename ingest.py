@@ -1,106 +1,244 @@
 """
 ingest.py
 
-This script handles the ingestion of documents from the corpus into a ChromaDB
-vector store. It performs the following steps:
+This script handles the ingestion of documents from the corpus into a vector
+store (ChromaDB by default, see `utils/vector_store.py` for other backends). It performs the following steps:
 1.  Scans the `corpus` directory for supported documents.
-2.  Uses the `data_scraper` utility to extract content (text and tables).
+2.  Uses the `data_scraper` utility to extract content (text and tables),
+    scraping several documents in parallel worker processes.
 3.  Chunks the extracted content into manageable pieces.
-4.  Generates embeddings for each chunk using a mock embedding function.
-5.  Stores the chunks and their corresponding embeddings in a local ChromaDB
-    collection for later retrieval.
+4.  Drops near-duplicate chunks (MinHash/LSH, see `utils/dedup.py`), keeping
+    one canonical chunk per cluster with the alternate sources recorded in
+    its metadata. Disable with `INGEST_DEDUP=0`.
+5.  Routes each chunk to a shard collection when sharding is enabled
+    (`VECTOR_STORE_SHARD_BY=source|period|hash`).
+6.  Generates embeddings for the chunks in batches and stores them, with
+    their metadata, in the vector store. Shards are built in parallel.
+7.  Optionally (`INGEST_SUMMARIES=1`) builds the summary tier: section and
+    document summaries used to answer broad questions (see `summarize.py`).
 """
+import contextvars
+import math
 import os
-import uuid
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
 from tqdm import tqdm
-import chromadb
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from unstructured.documents.elements import Table, Text
 
+from summarize import build_summary_index
+
 # Import our custom utilities
 from utils.data_scraper import scrape_document
-from utils.llm import embed_text # Using our mock embedding function
+from utils.dedup import deduplicate_chunks
+from utils.llm import IncompleteEmbeddingError, embed_texts
+from utils.rate_limiter import BATCH, request_priority
+from utils.vector_store import COLLECTION_NAME, get_vector_store
 
 # --- Constants ---
 CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'corpus')
-DB_DIR = os.path.join(os.path.dirname(__file__), 'db')
-CHROMA_COLLECTION_NAME = "rag_collection"
+CHROMA_COLLECTION_NAME = COLLECTION_NAME
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+EMBED_BATCH_SIZE = 100
+DEDUP_ENABLED = os.getenv("INGEST_DEDUP", "1") != "0"
+DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.8"))
+SUMMARIES_ENABLED = os.getenv("INGEST_SUMMARIES", "0") == "1"
 
-def ingest_data():
+def period_from_filename(file_name: str) -> Optional[str]:
     """
-    Main function to orchestrate the data ingestion pipeline.
+    Extracts the reporting period from a file name, e.g. "3Q2023" from
+    "ING_Historical_Trend_Data_3Q2023.pdf", or a bare year if that is all
+    there is.
     """
-    if not os.path.isdir(CORPUS_DIR):
-        print(f"Error: Corpus directory not found at '{CORPUS_DIR}'")
-        return
+    match = re.search(r"([1-4])Q[\s_-]?((?:19|20)\d{2})", file_name, re.IGNORECASE)
+    if match:
+        return f"{match.group(1)}Q{match.group(2)}"
+    match = re.search(r"(?:19|20)\d{2}", file_name)
+    return match.group(0) if match else None
 
-    print("--- Starting Data Ingestion ---")
+def extract_chunks(file_name: str) -> List[Dict]:
+    """
+    Scrapes and chunks a single corpus document. Runs in a worker process.
 
-    # 1. Initialize ChromaDB client and collection
-    print(f"Initializing ChromaDB client (persisting to '{DB_DIR}')...")
-    client = chromadb.PersistentClient(path=DB_DIR)
-    collection = client.get_or_create_collection(name=CHROMA_COLLECTION_NAME)
-    print(f"Collection '{CHROMA_COLLECTION_NAME}' ready.")
+    Args:
+        file_name: The name of a file in the corpus directory.
 
-    # 2. Initialize Text Splitter
+    Returns:
+        A list of chunks, each a dict with "id", "document" and "metadata".
+    """
     # This helps break down long text into smaller, more manageable chunks.
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=150
     )
+    file_path = os.path.join(CORPUS_DIR, file_name)
+
+    # Scrape the document to get a list of elements (text and tables)
+    elements = scrape_document(file_path)
+
+    if not elements:
+        print(f"Warning: No content extracted from {file_name}. Skipping.")
+        return []
+
+    period = period_from_filename(file_name)
+    chunks = []
+    for element in elements:
+        # For tables, we use the HTML representation to preserve structure.
+        if isinstance(element, Table) and hasattr(element, "metadata") and element.metadata.text_as_html:
+            content = element.metadata.text_as_html
+            content_type = "table"
+        # For text, we use the plain text.
+        elif isinstance(element, Text):
+            content = element.text
+            content_type = "text"
+        else:
+            continue # Skip elements we can't process
+
+        if not content or not content.strip():
+            continue
+
+        # Chunk the content
+        for i, chunk in enumerate(text_splitter.split_text(content)):
+            metadata = {
+                "source": file_name,
+                "content_type": content_type,
+                "element_id": str(element.id)
+            }
+            if period:
+                metadata["period"] = period
+
+            chunks.append({
+                "id": f"{file_name}_{element.id}_{i}",
+                "document": chunk,
+                "metadata": metadata,
+            })
+    return chunks
+
+def embed_and_store(collection, chunks: List[Dict]) -> int:
+    """
+    Embeds chunks in batches and adds them to the collection.
+
+    Returns:
+        The number of chunks stored.
+    """
+    stored = 0
+    for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+        batch = chunks[start:start + EMBED_BATCH_SIZE]
+        embeddings = embed_texts([chunk["document"] for chunk in batch])
+
+        # Rate limits and transient errors were already retried by
+        # `embed_texts`; skip what still failed rather than storing empty
+        # vectors, and let the caller report it.
+        kept = [(chunk, embedding) for chunk, embedding in zip(batch, embeddings) if embedding]
+        if not kept:
+            continue
 
-    # 3. Scan and process files from the corpus
+        collection.add(
+            ids=[chunk["id"] for chunk, _ in kept],
+            embeddings=[embedding for _, embedding in kept],
+            documents=[chunk["document"] for chunk, _ in kept],
+            metadatas=[chunk["metadata"] for chunk, _ in kept]
+        )
+        stored += len(kept)
+    return stored
+
+def group_by_shard(chunks: List[Dict], shard_for=None) -> Dict[Optional[str], List[Dict]]:
+    """
+    Groups chunks by the shard they are stored in (a single group when the
+    store is not sharded).
+    """
+    groups: Dict[Optional[str], List[Dict]] = {}
+    for chunk in chunks:
+        key = shard_for(chunk["id"], chunk["metadata"]) if shard_for else None
+        groups.setdefault(key, []).append(chunk)
+    return groups
+
+def embedding_calls(groups: Dict[Optional[str], List[Dict]]) -> int:
+    """Returns the number of embedding requests `embed_and_store` makes for these groups."""
+    return sum(math.ceil(len(group) / EMBED_BATCH_SIZE) for group in groups.values())
+
+def ingest_data():
+    """
+    Main function to orchestrate the data ingestion pipeline.
+
+    Raises:
+        IncompleteEmbeddingError: If some chunks could still not be embedded
+            after retries. The chunks that were embedded are stored.
+    """
+    if not os.path.isdir(CORPUS_DIR):
+        print(f"Error: Corpus directory not found at '{CORPUS_DIR}'")
+        return
+
+    print("--- Starting Data Ingestion ---")
+
+    # 1. Initialize the vector store and collection
+    collection = get_vector_store(CHROMA_COLLECTION_NAME, create=True)
+    print(f"Collection '{CHROMA_COLLECTION_NAME}' ready ({collection.backend} backend, persisting to '{collection.path}').")
+
+    # 2. Scan the corpus, then scrape and chunk the files in parallel
     files_to_process = [f for f in os.listdir(CORPUS_DIR) if f.endswith(('.pdf', '.xlsx'))]
     print(f"Found {len(files_to_process)} documents to process in '{CORPUS_DIR}'.")
+    if not files_to_process:
+        return
 
-    for file_name in tqdm(files_to_process, desc="Ingesting Documents"):
-        file_path = os.path.join(CORPUS_DIR, file_name)
-        
-        # Scrape the document to get a list of elements (text and tables)
-        elements = scrape_document(file_path)
+    chunks = []
+    with ProcessPoolExecutor(max_workers=max(1, min(INGEST_WORKERS, len(files_to_process)))) as pool:
+        futures = {pool.submit(extract_chunks, file_name): file_name for file_name in files_to_process}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Scraping Documents"):
+            chunks.extend(future.result())
+    print(f"Extracted {len(chunks)} chunks.")
+    extracted = len(chunks)
 
-        if not elements:
-            tqdm.write(f"Warning: No content extracted from {file_name}. Skipping.")
-            continue
+    # 3. Drop near-duplicates before paying to embed them
+    shard_for = getattr(collection, "shard_for", None)
+    if DEDUP_ENABLED and chunks:
+        calls_before = embedding_calls(group_by_shard(chunks, shard_for))
+        text_before = sum(len(chunk["document"].encode("utf-8")) for chunk in chunks)
+        chunks, removed = deduplicate_chunks(chunks, DEDUP_THRESHOLD)
+        calls_after = embedding_calls(group_by_shard(chunks, shard_for))
+        text_removed = text_before - sum(len(chunk["document"].encode("utf-8")) for chunk in chunks)
+        print(f"Removed {removed} near-duplicate chunks ({removed / extracted:.1%} chunk reduction, "
+              f"{text_removed / 1e6:.1f} MB of text); {calls_before - calls_after} fewer embedding calls "
+              f"({calls_before} -> {calls_after}).")
+
+    # 4. Group the chunks by shard so each shard is embedded and built by its own worker
+    groups = group_by_shard(chunks, shard_for)
+    if shard_for:
+        print(f"Building {len(groups)} shards (sharded by '{collection.shard_by}').")
 
-        for element in elements:
-            # For tables, we use the HTML representation to preserve structure.
-            if isinstance(element, Table) and hasattr(element, "metadata") and element.metadata.text_as_html:
-                content = element.metadata.text_as_html
-                content_type = "table"
-            # For text, we use the plain text.
-            elif isinstance(element, Text):
-                content = element.text
-                content_type = "text"
-            else:
-                continue # Skip elements we can't process
-
-            if not content or not content.strip():
-                continue
-
-            # Chunk the content
-            chunks = text_splitter.split_text(content)
-            
-            # Embed and store each chunk
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{file_name}_{element.id}_{i}"
-                embedding = embed_text(text=chunk) # Mock embedding call
-                
-                metadata = {
-                    "source": file_name,
-                    "content_type": content_type,
-                    "element_id": str(element.id)
-                }
-                
-                collection.add(
-                    ids=[chunk_id],
-                    embeddings=[embedding],
-                    documents=[chunk],
-                    metadatas=[metadata]
-                )
+    # Each task runs in a copy of this context, so the batch priority set by
+    # the caller also applies to the embedding calls made in worker threads.
+    with ThreadPoolExecutor(max_workers=max(1, min(INGEST_WORKERS, len(groups)))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, embed_and_store, collection, group)
+            for group in groups.values()
+        ]
+        stored = sum(future.result() for future in tqdm(as_completed(futures), total=len(futures), desc="Embedding Chunks"))
+
+    # Buffered backends (e.g. mmap) write their files here.
+    collection.flush()
 
     print("\n--- Data Ingestion Complete ---")
+    print(f"Stored {stored} of {len(chunks)} chunks ({extracted} extracted before de-duplication).")
     print(f"Total documents in collection: {collection.count()}")
+    if stored < len(chunks):
+        # Stored chunks are kept; re-running ingest adds only the missing ids.
+        raise IncompleteEmbeddingError(
+            f"{len(chunks) - stored} chunks could not be embedded and are missing from the collection. "
+            "Re-run ingest.py to add them."
+        )
+
+    # 5. Precompute the summary tier for broad questions
+    if SUMMARIES_ENABLED:
+        build_summary_index(chunks)
 
 if __name__ == '__main__':
-    ingest_data()
+    # Ingest runs at batch priority so it never starves interactive queries
+    # of the shared OpenAI rate limit.
+    with request_priority(BATCH):
+        try:
+            ingest_data()
+        except IncompleteEmbeddingError as e:
+            print(f"Error: {e}")
+            raise SystemExit(1)
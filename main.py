@@ -12,12 +12,19 @@ curl -X 'POST' \
   -d '{
   "prompt": "How did ING Group’s net interest income and cost/income ratio change between 3Q2022 and 3Q2023 across Retail Banking, Wholesale Banking, and the Corporate Line, and what might explain these differences?"
 }'
+
+Running `python main.py` starts a single process. To serve with several
+worker processes sharing one read-only index, use `serve.py`.
 """
+from typing import List, Literal, Optional
 from fastapi import FastAPI
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from agent import generate_enhanced_prompt
-from retriever import query_vector_store
-from utils.llm import get_response, llm, embedding_model
+from retriever import build_where, query_vector_store, retrieve_context, CHROMA_COLLECTION_NAME
+from utils.llm import coalescing_stats, get_routed_response, tier_stats
+from utils.metrics import process_memory_kb
+from utils.rate_limiter import scheduler
+from utils.vector_store import CollectionNotFoundError, get_vector_store
 
 # Initialize the FastAPI app
 app = FastAPI(
@@ -27,13 +34,44 @@ app = FastAPI(
 )
 
 class StoryRequest(BaseModel):
-    """Defines the structure of the request body for the /generate-story endpoint."""
+    """
+    Defines the structure of the request body for the /generate-story endpoint.
+    The source/content_type/period fields restrict retrieval to matching
+    chunks. deadline_ms and hedge_ms (positive, if set) bound the LLM
+    latency (see `utils.llm.get_routed_response`), and tier forces an LLM
+    tier. Other values are rejected with a 422.
+    """
     prompt: str
+    source: Optional[str] = None
+    content_type: Optional[str] = None
+    period: Optional[str] = None
+    deadline_ms: Optional[int] = Field(default=None, gt=0)
+    hedge_ms: Optional[int] = Field(default=None, gt=0)
+    tier: Optional[Literal["fast", "default", "long"]] = None
 
 class StoryResponse(BaseModel):
     """Defines the structure of the response for the /generate-story endpoint."""
     story: str
 
+# Upper bound on the number of chunks /retrieve returns per request.
+MAX_RETRIEVE_RESULTS = 100
+
+class RetrieveRequest(BaseModel):
+    """
+    Defines the structure of the request body for the /retrieve endpoint.
+    n_results must be between 1 and MAX_RETRIEVE_RESULTS; other values are
+    rejected with a 422.
+    """
+    prompt: str
+    n_results: int = Field(default=3, gt=0, le=MAX_RETRIEVE_RESULTS)
+    source: Optional[str] = None
+    content_type: Optional[str] = None
+    period: Optional[str] = None
+
+class RetrieveResponse(BaseModel):
+    """Defines the structure of the response for the /retrieve endpoint."""
+    documents: List[str]
+
 @app.post("/generate-story", response_model=StoryResponse)
 def generate_story_endpoint(request: StoryRequest):
     """
@@ -45,20 +83,65 @@ def generate_story_endpoint(request: StoryRequest):
 
     # This is the same logic as in agent.py, but adapted for an API
     
-    # 1. Retrieve context
-    retrieved_results = query_vector_store(query=request.prompt, n_results=3)
-    retrieved_docs = []
-    if retrieved_results and retrieved_results.get('documents'):
-        retrieved_docs = retrieved_results['documents'][0]
+    # 1. Retrieve context (summaries for broad prompts)
+    where = build_where(source=request.source, content_type=request.content_type, period=request.period)
+    retrieved_docs = retrieve_context(query=request.prompt, n_results=3, where=where)
 
     # 2. Generate enhanced prompt
     enhanced_prompt = generate_enhanced_prompt(request.prompt, retrieved_docs)
 
-    # 3. Get final response from the (mocked) LLM
-    final_response = get_response(user_prompt=enhanced_prompt, llm=llm)
+    # 3. Get final response from the LLM tier that fits the request
+    final_response = get_routed_response(
+        enhanced_prompt,
+        routing_text=request.prompt,
+        deadline_s=request.deadline_ms / 1000 if request.deadline_ms is not None else None,
+        hedge_s=request.hedge_ms / 1000 if request.hedge_ms is not None else None,
+        tier=request.tier,
+    )
 
     return StoryResponse(story=final_response)
 
+@app.post("/retrieve", response_model=RetrieveResponse)
+def retrieve_endpoint(request: RetrieveRequest):
+    """
+    API endpoint that only runs the retrieval step and returns the matching
+    context documents. Useful for load-testing the serving path without
+    paying for a chat completion.
+    """
+    where = build_where(source=request.source, content_type=request.content_type, period=request.period)
+    retrieved_results = query_vector_store(query=request.prompt, n_results=request.n_results, where=where)
+    retrieved_docs = []
+    if retrieved_results and retrieved_results.get('documents'):
+        retrieved_docs = retrieved_results['documents'][0]
+    return RetrieveResponse(documents=retrieved_docs)
+
+@app.get("/stats")
+def stats_endpoint():
+    """
+    Reports which worker process served the request, its memory usage, the
+    index snapshot it is serving, its LLM call-coalescing counters, its
+    per-tier LLM latency and token usage and its OpenAI rate-limit queue
+    wait times. With `serve.py`, calling this
+    repeatedly shows the per-worker memory overhead on top of the shared
+    index.
+    """
+    stats = {
+        "memory_kb": process_memory_kb(),
+        "llm_coalescing": coalescing_stats(),
+        "llm_tiers": tier_stats(),
+        "rate_limit_waits": scheduler.stats(),
+    }
+    try:
+        store = get_vector_store(CHROMA_COLLECTION_NAME)
+        stats["vector_store"] = {
+            "backend": store.backend,
+            "count": store.count(),
+            "version": getattr(store, "version", None),
+        }
+    except CollectionNotFoundError:
+        stats["vector_store"] = None
+    return stats
+
 if __name__ == "__main__":
     import uvicorn
     print("--- Starting FastAPI Server ---")
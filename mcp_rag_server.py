@@ -16,13 +16,19 @@ Notes:
     create_jira: bool = False
     project_key: str | None = None
     labels: list[str] | None = None
+    source: str | None = None        (only retrieve from this file)
+    content_type: str | None = None  ("text" or "table")
+    period: str | None = None        (e.g. "3Q2023")
+    deadline_s: float | None = None  (LLM latency budget in seconds)
+    hedge_s: float | None = None     (start the fallback LLM tier after this many seconds)
+    tier: str | None = None          ("fast", "default" or "long"; chosen automatically if unset)
 """
 
 from mcp.server.fastmcp import FastMCP
 import sys
 import time
 import logging
-from typing import Optional
+from typing import Literal, Optional
 
 # Log to stderr ONLY — stdout must remain clean for JSON protocol
 logging.basicConfig(stream=sys.stderr, level=logging.INFO)
@@ -42,13 +48,22 @@ def business_analyst_story_generator(
     create_jira: bool = False,
     project_key: Optional[str] = None,
     labels: Optional[list[str]] = None,
+    source: Optional[str] = None,
+    content_type: Optional[str] = None,
+    period: Optional[str] = None,
+    deadline_s: Optional[float] = None,
+    hedge_s: Optional[float] = None,
+    tier: Optional[Literal["fast", "default", "long"]] = None,
 ) -> str:
     """Generate a detailed BA user story from a high-level prompt using RAG.
 
     Steps:
-      1) Retrieve context from vector store
+      1) Retrieve context from vector store (precomputed summaries for broad
+         prompts), optionally restricted to a source file, content type
+         ("text"/"table") or period ("3Q2023")
       2) Build enhanced prompt
-      3) Generate final story with LLM
+      3) Generate final story with the LLM tier that fits the prompt and
+         the optional deadline, hedging to a fallback tier if asked
       4) (Optional) Create a Jira Story and append the issue key
     """
     try:
@@ -56,15 +71,13 @@ def business_analyst_story_generator(
         start_ts = time.time()
 
         # Heavy stuff only when the tool is invoked
-        from retriever import query_vector_store
+        from retriever import build_where, retrieve_context
         from agent import generate_enhanced_prompt
-        from utils.llm import get_response, llm
+        from utils.llm import get_routed_response
 
         # 1) Retrieve context
-        retrieved_results = query_vector_store(query=prompt, n_results=3)
-        retrieved_docs = []
-        if retrieved_results and retrieved_results.get("documents"):
-            retrieved_docs = retrieved_results["documents"][0]
+        where = build_where(source=source, content_type=content_type, period=period)
+        retrieved_docs = retrieve_context(query=prompt, n_results=3, where=where)
         logging.info(f"Retrieved {len(retrieved_docs)} docs")
 
         # 2) Build enhanced prompt
@@ -72,7 +85,9 @@ def business_analyst_story_generator(
         logging.info(f"Enhanced prompt length: {len(enhanced_prompt)}")
 
         # 3) Generate with LLM
-        final_response = get_response(user_prompt=enhanced_prompt, llm=llm)
+        final_response = get_routed_response(
+            enhanced_prompt, routing_text=prompt, deadline_s=deadline_s, hedge_s=hedge_s, tier=tier
+        )
         logging.info(f"LLM completed in {time.time()-start_ts:.2f}s")
 
         # 4) Optional Jira creation
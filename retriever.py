@@ -1,71 +1,212 @@
 """
 retriever.py
 
-This script handles the retrieval of relevant documents from the ChromaDB
-vector store based on a user's query. It performs the following steps:
-1.  Initializes a connection to the existing ChromaDB.
+This script handles the retrieval of relevant documents from the vector store
+based on a user's query. It performs the following steps:
+1.  Opens the existing vector store (ChromaDB by default, or the memory-mapped
+    backend when `VECTOR_STORE_BACKEND=mmap`). The store is cached per process.
 2.  Takes a user query as input.
 3.  Generates an embedding for the query using the same (mock) model used
     during ingestion.
 4.  Queries the vector store to find the most similar document chunks.
 5.  Returns the retrieved chunks, which can then be used as context for an LLM.
+
+`retrieve_context` adds routing on top: broad questions ("summarize ING's
+2023 performance trends") are answered from the summary tier built by
+`summarize.py`, drilling down to leaf chunks only when the question also
+asks for specifics. Other questions, or a missing summary tier, go straight
+to the leaf chunks.
 """
-import os
-import chromadb
-from typing import List, Dict
+import re
+import time
+from typing import List, Dict, Optional
 
 # Import our custom utilities
 from utils.llm import embed_text # Using our mock embedding function
+from utils.vector_store import (
+    COLLECTION_NAME,
+    SUMMARY_COLLECTION_NAME,
+    CollectionNotFoundError,
+    get_vector_store,
+    source_filter,
+)
 
 # --- Constants ---
-DB_DIR = os.path.join(os.path.dirname(__file__), 'db')
-CHROMA_COLLECTION_NAME = "rag_collection"
+CHROMA_COLLECTION_NAME = COLLECTION_NAME
+DRILL_DOWN_RESULTS = 3
+# How often a process that found no summary tier looks for one again.
+SUMMARY_TIER_RECHECK_S = 60.0
+
+# Questions about a whole filing or period rather than a specific fact.
+BROAD_QUERY_PATTERN = re.compile(
+    r"\b(summar(y|ies|ize|ise|izing|ising)|overview|overall|trends?|high[- ]level|big picture|"
+    r"key (themes|takeaways|highlights|points)|main (themes|takeaways|highlights|points)|"
+    r"in general|general picture|outlook|how did .+ (perform|develop|evolve))\b",
+    re.IGNORECASE,
+)
+# Signals that a broad question also needs exact figures from the leaf chunks.
+DETAIL_QUERY_PATTERN = re.compile(
+    r"(\d+(\.\d+)?\s?%|\b(exact|precise|specific|figures?|numbers?|how much|how many|breakdown|"
+    r"table|ratio|amount|compare|comparison|versus|vs\.?)\b)",
+    re.IGNORECASE,
+)
+
+def build_where(source: Optional[str] = None, content_type: Optional[str] = None,
+                period: Optional[str] = None) -> Optional[Dict]:
+    """
+    Builds a metadata filter from the fields `ingest.py` stores with every
+    chunk. Fields left as None are not filtered on.
+
+    Args:
+        source: Only chunks from this file (e.g. "ING_Historical_Trend_Data_3Q2023.pdf"),
+            including its near-duplicates that were folded into a chunk of
+            another file at ingest.
+        content_type: Only "text" or only "table" chunks.
+        period: Only chunks from this reporting period (e.g. "3Q2023").
 
-def query_vector_store(query: str, n_results: int = 5) -> Dict:
+    Returns:
+        A ChromaDB-style `where` filter, or None if no field was given.
+    """
+    clauses = [source_filter(source)] if source else []
+    clauses += [
+        {field: value}
+        for field, value in (("content_type", content_type), ("period", period))
+        if value
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def query_vector_store(query: str, n_results: int = 5, where: Optional[Dict] = None,
+                       collection_name: str = CHROMA_COLLECTION_NAME,
+                       query_embedding: Optional[List[float]] = None) -> Dict:
     """
-    Queries the ChromaDB collection to find documents relevant to the user's query.
+    Queries the vector store collection to find documents relevant to the user's query.
 
     Args:
         query: The user's question or query string.
         n_results: The number of results to retrieve.
+        where: Optional metadata filter (ChromaDB syntax, see `build_where`),
+            which restricts the search to matching chunks. On a sharded
+            collection it also prunes shards that cannot match, and the
+            remaining shards are searched concurrently.
+        collection_name: The collection to search (the leaf chunks by default).
+        query_embedding: The query's embedding, if the caller already has it.
 
     Returns:
-        A dictionary containing the query results from ChromaDB.
+        A dictionary containing the query results, in ChromaDB's format.
     """
-    if not os.path.isdir(DB_DIR):
-        print(f"Error: Database directory not found at '{DB_DIR}'.")
-        print("Please run the 'ingest.py' script first to create the database.")
-        return {}
-
     print("--- Querying Vector Store ---")
 
-    # 1. Initialize ChromaDB client and get the collection
-    print(f"Connecting to ChromaDB at '{DB_DIR}'...")
-    client = chromadb.PersistentClient(path=DB_DIR)
-    
+    # 1. Open the vector store and get the collection
     try:
-        collection = client.get_collection(name=CHROMA_COLLECTION_NAME)
-        print(f"Successfully connected to collection '{CHROMA_COLLECTION_NAME}'.")
-    except ValueError:
-        print(f"Error: Collection '{CHROMA_COLLECTION_NAME}' not found.")
+        store = get_vector_store(collection_name)
+        print(f"Successfully connected to collection '{collection_name}' ({store.backend}).")
+    except CollectionNotFoundError as e:
+        print(f"Error: {e}")
         print("Please ensure you have ingested data using 'ingest.py'.")
         return {}
 
 
     # 2. Generate an embedding for the user's query
-    print(f"Generating embedding for query: '{query}'")
-    query_embedding = embed_text(text=query) # Mock embedding call
+    if query_embedding is None:
+        print(f"Generating embedding for query: '{query}'")
+        query_embedding = embed_text(text=query) # Mock embedding call
 
     # 3. Query the collection
-    print(f"Performing query to find top {n_results} results...")
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
+    print(f"Performing query to find top {n_results} results" + (f" matching {where}..." if where else "..."))
+    try:
+        results = store.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=where
+        )
+    except CollectionNotFoundError as e:
+        # Deleted since it was opened, e.g. while `summarize.py` rebuilds the summary tier.
+        print(f"Error: {e}")
+        return {}
 
     print("--- Query Complete ---")
     return results
 
+_summary_tier = {"available": None, "checked_at": 0.0}
+
+def summary_tier_available() -> bool:
+    """
+    True if the summary collection exists. The answer is cached, so broad
+    queries do not reopen a missing collection (and log an error) every time;
+    a missing tier is looked for again every `SUMMARY_TIER_RECHECK_S` seconds,
+    so one built while the server runs is picked up.
+    """
+    now = time.monotonic()
+    available = _summary_tier["available"]
+    if available or (available is not None and now - _summary_tier["checked_at"] < SUMMARY_TIER_RECHECK_S):
+        return available
+    try:
+        get_vector_store(SUMMARY_COLLECTION_NAME)
+        available = True
+    except CollectionNotFoundError:
+        available = False
+    _summary_tier.update(available=available, checked_at=now)
+    return available
+
+def is_broad_query(query: str) -> bool:
+    """True if the query asks for an overview rather than a specific fact."""
+    return bool(BROAD_QUERY_PATTERN.search(query))
+
+def _documents(results: Dict) -> List[str]:
+    if results and results.get('documents'):
+        return results['documents'][0]
+    return []
+
+def _drill_down_where(metadata: Dict, where: Optional[Dict]) -> Dict:
+    """Restricts leaf retrieval to the part of the corpus a summary covers."""
+    clauses = [where] if where else []
+    clauses.append(source_filter(metadata.get("source")))
+    if metadata.get("level") == "section" and metadata.get("element_ids"):
+        clauses.append({"element_id": {"$in": metadata["element_ids"].split(",")}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def retrieve_context(query: str, n_results: int = 3, where: Optional[Dict] = None) -> List[str]:
+    """
+    Retrieves context documents for a prompt, routing by the kind of question.
+
+    Broad questions get the `n_results` best-matching section or document
+    summaries. If the question also asks for specifics, up to
+    `DRILL_DOWN_RESULTS` leaf chunks from the part of the corpus covered by
+    the best summary are added. Everything else, or any question when no
+    summary tier was built, gets `n_results` leaf chunks.
+
+    Args:
+        query: The user's question or query string.
+        n_results: The number of summaries or leaf chunks to retrieve.
+        where: Optional metadata filter, see `build_where`.
+
+    Returns:
+        The retrieved documents, best first.
+    """
+    if not is_broad_query(query) or not summary_tier_available():
+        return _documents(query_vector_store(query=query, n_results=n_results, where=where))
+
+    print("Broad query: searching the summary tier.")
+    query_embedding = embed_text(text=query)
+    summaries = query_vector_store(query=query, n_results=n_results, where=where,
+                                   collection_name=SUMMARY_COLLECTION_NAME, query_embedding=query_embedding)
+    documents = _documents(summaries)
+    if not documents:
+        print("No summaries matched; falling back to leaf chunks.")
+        return _documents(query_vector_store(query=query, n_results=n_results, where=where,
+                                             query_embedding=query_embedding))
+
+    if DETAIL_QUERY_PATTERN.search(query):
+        top_metadata = summaries['metadatas'][0][0]
+        print(f"Drilling down into '{top_metadata.get('source')}' for specifics.")
+        leaves = query_vector_store(query=query, n_results=DRILL_DOWN_RESULTS,
+                                    where=_drill_down_where(top_metadata, where),
+                                    query_embedding=query_embedding)
+        documents = documents + _documents(leaves)
+    return documents
+
 if __name__ == '__main__':
     # Example of how to use the retriever
     sample_query = "What were the net profits for the last quarter?"
@@ -0,0 +1,133 @@
+"""
+serve.py
+
+Multi-process serving mode for the FastAPI app in `main.py`.
+
+`python main.py` runs a single uvicorn process. This script instead:
+1.  Imports the app and opens the read-only index once, in a parent process.
+    With the memory-mapped backend (`VECTOR_STORE_BACKEND=mmap`) the index
+    pages are also read into the OS page cache at this point.
+2.  Binds the listening socket in the parent.
+3.  Forks N workers that all accept on that socket. Workers inherit the
+    loaded modules copy-on-write and share the mapped index pages, so each
+    extra worker only adds its own private heap.
+4.  Restarts workers that exit unexpectedly and forwards SIGINT/SIGTERM.
+
+When `ingest.py` publishes a new mmap snapshot, every worker switches to it
+atomically on its next query; no restart is needed.
+
+The ChromaDB backend opens SQLite connections that must not be shared across
+a fork, so with that backend each worker opens its own client after forking
+and nothing is shared.
+
+Usage:
+    VECTOR_STORE_BACKEND=mmap python serve.py --workers 4 --port 8000
+
+Check the per-worker memory overhead with repeated calls to `GET /stats`, and
+the requests/sec scaling across cores with `benchmark_serving.py`.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+
+
+def preload(backend: str):
+    """Imports the app and maps the index before any worker is forked."""
+    import main
+    from retriever import CHROMA_COLLECTION_NAME
+    from utils.vector_store import CollectionNotFoundError, get_vector_store
+
+    if backend == "mmap":
+        try:
+            store = get_vector_store(CHROMA_COLLECTION_NAME)
+            store.warm()
+            print(f"Preloaded index snapshot '{store.version}' ({store.count()} chunks).")
+        except CollectionNotFoundError as e:
+            print(f"Warning: {e} Workers will open the index once it is ingested.")
+    return main.app
+
+
+def run_worker(app, sock: socket.socket, log_level: str) -> None:
+    """Runs one uvicorn server on an already-bound, shared socket."""
+    import uvicorn
+
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(host: str, port: int, workers: int, log_level: str) -> None:
+    from utils.vector_store import DEFAULT_BACKEND
+
+    if not hasattr(os, "fork"):
+        # No fork (e.g. Windows): fall back to uvicorn's spawning supervisor.
+        # Workers still share the mmap index through the page cache.
+        import uvicorn
+        uvicorn.run("main:app", host=host, port=port, workers=workers, log_level=log_level)
+        return
+
+    if DEFAULT_BACKEND != "mmap" and workers > 1:
+        print(f"Warning: the '{DEFAULT_BACKEND}' backend cannot be shared between workers; "
+              "each worker will open its own copy. Set VECTOR_STORE_BACKEND=mmap to share one index.")
+
+    app = preload(DEFAULT_BACKEND)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = set()
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(app, sock, log_level)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def shutdown(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    print(f"--- Starting {workers} workers on http://{host}:{port} (parent pid {os.getpid()}) ---")
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}; restarting.", file=sys.stderr)
+            spawn()
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the RAG agent API with multiple worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.log_level)
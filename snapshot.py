@@ -0,0 +1,294 @@
+"""
+snapshot.py
+
+Portable export/import of a vector-store collection, so a new API node can
+start from a snapshot in seconds instead of copying the opaque `db/`
+directory or re-running `ingest.py` (OCR and embedding of the whole corpus).
+
+A snapshot is a single `.npz` (zip) file written and read in batches:
+    manifest.json              collection name, embedding model id, dimension,
+                               record count, text codec and, per batch, the
+                               record count and SHA-256 of each member
+    embeddings_<n>.npy         (batch, dim) float32 or float16 embeddings
+    records_<n>.jsonl.<codec>  one {"id", "document", "metadata"} line per
+                               record, compressed with zstd (zlib if the
+                               `zstandard` package is not installed)
+
+Import verifies every member against its hash before loading it, refuses a
+snapshot built with a different embedding model than the one configured in
+`utils/llm.py` (unless forced), and bulk-loads the target collection in large
+batches. The target backend and sharding follow the usual
+`VECTOR_STORE_BACKEND` / `VECTOR_STORE_SHARD_BY` settings.
+
+Usage:
+    python snapshot.py export rag.npz
+    python snapshot.py verify rag.npz
+    VECTOR_STORE_BACKEND=mmap python snapshot.py import rag.npz
+"""
+import argparse
+import hashlib
+import io
+import json
+import time
+import zipfile
+import zlib
+from typing import Dict, Optional
+
+import numpy as np
+
+from utils.vector_store import COLLECTION_NAME, get_vector_store
+
+try:
+    import zstandard
+except ImportError:  # Optional: fall back to zlib for the text column.
+    zstandard = None
+
+SNAPSHOT_FORMAT = "rag-vector-snapshot"
+SNAPSHOT_VERSION = 1
+EXPORT_BATCH_SIZE = 5000
+
+
+class SnapshotError(RuntimeError):
+    """Raised when a snapshot is malformed, corrupted or incompatible."""
+
+
+def current_embedding_model() -> Optional[str]:
+    """Returns the embedding model id configured in `utils/llm.py`, if it can be loaded."""
+    try:
+        from utils.llm import embedding_model
+        return embedding_model.model
+    except Exception as e:
+        print(f"Warning: Could not determine the configured embedding model: {e}")
+        return None
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise SnapshotError("This snapshot is zstd-compressed; install the 'zstandard' package to import it.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def export_snapshot(output_path: str, collection_name: str = COLLECTION_NAME,
+                    dtype: str = "float32", embedding_model: Optional[str] = None,
+                    batch_size: int = EXPORT_BATCH_SIZE) -> Dict:
+    """
+    Streams a collection into a snapshot file.
+
+    Args:
+        output_path: The snapshot file to write.
+        collection_name: The collection to export.
+        dtype: "float32" (exact) or "float16" (half the size).
+        embedding_model: The model id to record. Defaults to the configured one.
+        batch_size: Records per batch.
+
+    Returns:
+        The snapshot manifest.
+    """
+    store = get_vector_store(collection_name)
+    codec = "zstd" if zstandard is not None else "zlib"
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "collection": collection_name,
+        "embedding_model": embedding_model or current_embedding_model(),
+        "source_backend": store.backend,
+        "dtype": dtype,
+        "text_codec": codec,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "dimension": None,
+        "count": 0,
+        "batches": [],
+    }
+
+    # Embeddings are already dense floats, so they are stored uncompressed;
+    # the text column carries its own compression.
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for n, batch in enumerate(store.iter_batches(batch_size)):
+            embeddings = np.ascontiguousarray(batch["embeddings"], dtype=dtype)
+            buffer = io.BytesIO()
+            np.save(buffer, embeddings)
+            embeddings_bytes = buffer.getvalue()
+
+            lines = "".join(
+                json.dumps({"id": i, "document": d, "metadata": m}, ensure_ascii=False) + "\n"
+                for i, d, m in zip(batch["ids"], batch["documents"], batch["metadatas"])
+            )
+            records_bytes = _compress(lines.encode("utf-8"), codec)
+
+            embeddings_name = f"embeddings_{n:05d}.npy"
+            records_name = f"records_{n:05d}.jsonl.{codec}"
+            archive.writestr(embeddings_name, embeddings_bytes)
+            archive.writestr(records_name, records_bytes)
+
+            manifest["dimension"] = int(embeddings.shape[1])
+            manifest["count"] += len(batch["ids"])
+            manifest["batches"].append({
+                "count": len(batch["ids"]),
+                "embeddings": embeddings_name,
+                "embeddings_sha256": _sha256(embeddings_bytes),
+                "records": records_name,
+                "records_sha256": _sha256(records_bytes),
+            })
+            print(f"Exported batch {n} ({manifest['count']} records so far).")
+
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+    print(f"Snapshot of '{collection_name}' written to '{output_path}' ({manifest['count']} records).")
+    return manifest
+
+
+def _open_archive(snapshot_path: str) -> zipfile.ZipFile:
+    try:
+        return zipfile.ZipFile(snapshot_path, "r")
+    except (OSError, zipfile.BadZipFile) as e:
+        raise SnapshotError(f"Cannot open snapshot '{snapshot_path}': {e}")
+
+
+def _read_member(archive: zipfile.ZipFile, name: str) -> bytes:
+    """Reads one archive member, reporting a missing or corrupted member as a SnapshotError."""
+    try:
+        return archive.read(name)
+    except KeyError:
+        raise SnapshotError(f"Snapshot is missing '{name}'; it is incomplete or not a snapshot.")
+    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+        raise SnapshotError(f"Cannot read '{name}' ({e}); the snapshot is corrupted.")
+
+
+def _read_manifest(archive: zipfile.ZipFile) -> Dict:
+    try:
+        manifest = json.loads(_read_member(archive, "manifest.json"))
+    except ValueError as e:
+        raise SnapshotError(f"Snapshot manifest is not valid JSON: {e}")
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format: {manifest.get('format')} v{manifest.get('version')}.")
+    return manifest
+
+
+def _read_batch(archive: zipfile.ZipFile, manifest: Dict, entry: Dict) -> Dict:
+    """Reads one batch, checking both members against their recorded hashes."""
+    embeddings_bytes = _read_member(archive, entry["embeddings"])
+    records_bytes = _read_member(archive, entry["records"])
+    if _sha256(embeddings_bytes) != entry["embeddings_sha256"]:
+        raise SnapshotError(f"Hash mismatch in '{entry['embeddings']}'; the snapshot is corrupted.")
+    if _sha256(records_bytes) != entry["records_sha256"]:
+        raise SnapshotError(f"Hash mismatch in '{entry['records']}'; the snapshot is corrupted.")
+
+    try:
+        embeddings = np.load(io.BytesIO(embeddings_bytes)).astype(np.float32)
+        records = [json.loads(line) for line in _decompress(records_bytes, manifest["text_codec"]).splitlines()]
+    except SnapshotError:
+        raise
+    except Exception as e:  # zlib.error, zstandard.ZstdError, malformed .npy or JSON
+        raise SnapshotError(f"Cannot decode batch '{entry['records']}' ({e}); the snapshot is corrupted.")
+    if len(records) != entry["count"] or embeddings.shape[0] != entry["count"]:
+        raise SnapshotError(f"Batch '{entry['records']}' does not contain the expected {entry['count']} records.")
+    return {
+        "ids": [record["id"] for record in records],
+        "embeddings": embeddings,
+        "documents": [record["document"] for record in records],
+        "metadatas": [record["metadata"] for record in records],
+    }
+
+
+def verify_snapshot(snapshot_path: str) -> Dict:
+    """Checks every batch of a snapshot against its hashes. Returns the manifest."""
+    with _open_archive(snapshot_path) as archive:
+        manifest = _read_manifest(archive)
+        for entry in manifest["batches"]:
+            _read_batch(archive, manifest, entry)
+    print(f"Snapshot '{snapshot_path}' is intact: {manifest['count']} records, "
+          f"{len(manifest['batches'])} batches, embedding model '{manifest['embedding_model']}'.")
+    return manifest
+
+
+def import_snapshot(snapshot_path: str, collection_name: Optional[str] = None,
+                    force: bool = False, append: bool = False) -> int:
+    """
+    Bulk-loads a snapshot into the configured vector store.
+
+    Args:
+        snapshot_path: The snapshot file to import.
+        collection_name: Target collection. Defaults to the snapshot's own.
+        force: Import even if the embedding model differs from the configured one.
+        append: Import into a collection that already has records.
+
+    Returns:
+        The number of records in the collection after the import.
+    """
+    start = time.perf_counter()
+    with _open_archive(snapshot_path) as archive:
+        manifest = _read_manifest(archive)
+        collection_name = collection_name or manifest["collection"]
+
+        configured_model = current_embedding_model()
+        if configured_model and manifest["embedding_model"] != configured_model and not force:
+            raise SnapshotError(
+                f"Snapshot was embedded with '{manifest['embedding_model']}' but this node uses "
+                f"'{configured_model}'; queries would not match. Use --force to import anyway."
+            )
+
+        store = get_vector_store(collection_name, create=True)
+        if store.count() and not append:
+            raise SnapshotError(
+                f"Collection '{collection_name}' already has {store.count()} records. "
+                "Use --append to import into it anyway."
+            )
+
+        def batches():
+            for n, entry in enumerate(manifest["batches"]):
+                yield _read_batch(archive, manifest, entry)
+                print(f"Imported batch {n + 1}/{len(manifest['batches'])}.")
+
+        # Batches are verified and written one at a time; buffered backends
+        # (mmap) stream them into the new snapshot rather than holding them all.
+        store.bulk_add(batches(), manifest["count"])
+
+    total = store.count()
+    print(f"Imported {manifest['count']} records into '{collection_name}' ({store.backend}) "
+          f"in {time.perf_counter() - start:.1f}s. Collection now has {total} records.")
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export, verify or import a vector-store snapshot.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write the collection to a snapshot file.")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--collection", default=COLLECTION_NAME)
+    export_parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    export_parser.add_argument("--embedding-model", help="Model id to record (default: the configured model).")
+    export_parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+
+    verify_parser = commands.add_parser("verify", help="Check a snapshot's integrity.")
+    verify_parser.add_argument("path")
+
+    import_parser = commands.add_parser("import", help="Load a snapshot into the configured vector store.")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--collection", help="Target collection (default: the snapshot's).")
+    import_parser.add_argument("--force", action="store_true", help="Ignore an embedding model mismatch.")
+    import_parser.add_argument("--append", action="store_true", help="Import into a non-empty collection.")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "export":
+            export_snapshot(args.path, args.collection, args.dtype, args.embedding_model, args.batch_size)
+        elif args.command == "verify":
+            verify_snapshot(args.path)
+        else:
+            import_snapshot(args.path, args.collection, args.force, args.append)
+    except SnapshotError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
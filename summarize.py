@@ -0,0 +1,240 @@
+"""
+summarize.py
+
+Builds the summary tier of the index: per-section and per-document summaries
+of the corpus, embedded and stored in their own collection
+(`SUMMARY_COLLECTION_NAME`, "rag_collection__summaries" by default).
+
+Broad questions ("summarize ING's 2023 performance trends") are answered from
+this tier by `retriever.retrieve_context`, so their prompt size and LLM
+latency stay bounded however large the corpus grows. The summaries are
+computed once, at ingest time, rather than per query:
+1.  Each document's chunks are packed, in order, into sections of at most
+    `SECTION_CHARS` characters, and every section is summarized.
+2.  The section summaries of a document are combined into a document
+    summary. If they do not fit in one prompt, they are combined in groups,
+    level by level, until one summary remains.
+3.  Summaries are stored with `level` ("section" or "document"), `source`
+    and `period` metadata. Section summaries also list the `element_ids`
+    they cover, so the retriever can drill down to the leaf chunks.
+
+The stage runs as part of `ingest.py` when `INGEST_SUMMARIES=1`, or on its
+own against an already-ingested collection:
+    python summarize.py
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from tqdm import tqdm
+
+from utils.llm import FAILED_RESPONSE, IncompleteEmbeddingError, embed_texts, get_response
+from utils.rate_limiter import BATCH, request_priority
+from utils.vector_store import COLLECTION_NAME, SUMMARY_COLLECTION_NAME, delete_collection, get_vector_store
+
+# --- Constants ---
+SECTION_CHARS = int(os.getenv("SUMMARY_SECTION_CHARS", "8000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+EMBED_BATCH_SIZE = 100
+
+SECTION_PROMPT = """You are summarizing part of the document "{source}" for a business analyst.
+Write a concise summary (at most 150 words) of the excerpt below. Keep the key figures,
+reporting periods, business segments and trends; leave out boilerplate.
+
+EXCERPT:
+---
+{text}
+---
+"""
+
+DOCUMENT_PROMPT = """You are summarizing the document "{source}" for a business analyst.
+Below are summaries of consecutive parts of it. Combine them into one overview (at most
+250 words) covering the main results, trends across periods and segments, and notable changes.
+
+PART SUMMARIES:
+---
+{text}
+---
+"""
+
+
+def pack_sections(texts: List[str], max_chars: int = SECTION_CHARS) -> List[List[int]]:
+    """
+    Packs consecutive texts into groups of at most `max_chars` characters
+    (a single longer text gets a group of its own).
+
+    Returns:
+        The groups, as lists of indices into `texts`.
+    """
+    groups, current, size = [], [], 0
+    for i, text in enumerate(texts):
+        if current and size + len(text) > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += len(text)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _summarize(template: str, source: str, text: str) -> Optional[str]:
+    summary = get_response(user_prompt=template.format(source=source, text=text))
+    return None if summary == FAILED_RESPONSE else summary
+
+
+def summarize_document(source: str, chunks: List[Dict]) -> List[Dict]:
+    """
+    Summarizes one document's chunks into section and document summaries.
+
+    Args:
+        source: The document's file name.
+        chunks: The document's chunks in document order, as produced by
+            `ingest.extract_chunks`.
+
+    Returns:
+        Summary records, each a dict with "id", "document" and "metadata".
+    """
+    base_metadata = {"source": source, "content_type": "summary"}
+    if chunks[0]["metadata"].get("period"):
+        base_metadata["period"] = chunks[0]["metadata"]["period"]
+
+    records = []
+    section_summaries = []
+    sections = pack_sections([chunk["document"] for chunk in chunks])
+    for n, members in enumerate(sections):
+        text = "\n\n".join(chunks[i]["document"] for i in members)
+        summary = _summarize(SECTION_PROMPT, source, text)
+        if summary is None:
+            print(f"Warning: Could not summarize section {n} of {source}. Skipping it.")
+            continue
+        section_summaries.append(summary)
+        element_ids = []
+        for i in members:
+            element_id = chunks[i]["metadata"].get("element_id")
+            if element_id and element_id not in element_ids:
+                element_ids.append(element_id)
+        records.append({
+            "id": f"{source}::section::{n}",
+            "document": summary,
+            "metadata": dict(base_metadata, level="section", section=n,
+                             element_ids=",".join(element_ids), chunk_count=len(members)),
+        })
+
+    if not section_summaries:
+        return []
+    if len(sections) == 1:
+        # A one-section document: its section summary is the document summary.
+        records[0]["id"] = f"{source}::document"
+        records[0]["metadata"]["level"] = "document"
+        return records
+
+    # Combine section summaries level by level until one remains.
+    summaries = section_summaries
+    while len(summaries) > 1:
+        combined = []
+        for members in pack_sections(summaries):
+            summary = _summarize(DOCUMENT_PROMPT, source, "\n\n".join(summaries[i] for i in members))
+            if summary is not None:
+                combined.append(summary)
+        if not combined or len(combined) == len(summaries):
+            print(f"Warning: Could not combine the section summaries of {source}.")
+            return records
+        summaries = combined
+
+    records.append({
+        "id": f"{source}::document",
+        "document": summaries[0],
+        "metadata": dict(base_metadata, level="document", chunk_count=len(chunks)),
+    })
+    return records
+
+
+def build_summary_index(chunks: List[Dict], collection_name: str = SUMMARY_COLLECTION_NAME) -> int:
+    """
+    Summarizes the chunks of every document and rebuilds the summary
+    collection from them. Documents are summarized in parallel.
+
+    The previous summaries are only dropped once every new summary has been
+    embedded, so a failed run leaves the existing tier in place, and a
+    rebuild never leaves summaries of removed or changed documents behind.
+
+    Args:
+        chunks: Chunks with "id", "document" and "metadata" (which must hold
+            "source"), in document order within each source.
+        collection_name: The summary collection to rebuild.
+
+    Returns:
+        The number of summaries stored.
+
+    Raises:
+        IncompleteEmbeddingError: If any summary could not be embedded. The
+            existing collection is then left unchanged.
+    """
+    documents: Dict[str, List[Dict]] = {}
+    for chunk in chunks:
+        documents.setdefault(chunk["metadata"]["source"], []).append(chunk)
+    if not documents:
+        return 0
+
+    print(f"--- Building Summary Tier for {len(documents)} documents ---")
+
+    # Copy the caller's context so its request priority applies in the workers.
+    with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_WORKERS, len(documents)))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, summarize_document, source, doc_chunks)
+            for source, doc_chunks in documents.items()
+        ]
+        records = []
+        for future in tqdm(futures, desc="Summarizing Documents"):
+            records.extend(future.result())
+
+    kept = []
+    for start in range(0, len(records), EMBED_BATCH_SIZE):
+        batch = records[start:start + EMBED_BATCH_SIZE]
+        embeddings = embed_texts([record["document"] for record in batch])
+        kept.extend((record, embedding) for record, embedding in zip(batch, embeddings) if embedding)
+    if len(kept) < len(records):
+        raise IncompleteEmbeddingError(
+            f"{len(records) - len(kept)} of {len(records)} summaries could not be embedded; "
+            f"keeping the existing '{collection_name}'."
+        )
+
+    # Summary ids are fixed per source and section, and adding an existing id
+    # is ignored, so the collection is replaced rather than added to.
+    delete_collection(collection_name)
+    collection = get_vector_store(collection_name, create=True)
+    for start in range(0, len(kept), EMBED_BATCH_SIZE):
+        batch = kept[start:start + EMBED_BATCH_SIZE]
+        collection.add(
+            ids=[record["id"] for record, _ in batch],
+            embeddings=[embedding for _, embedding in batch],
+            documents=[record["document"] for record, _ in batch],
+            metadatas=[record["metadata"] for record, _ in batch]
+        )
+    collection.flush()
+
+    print(f"Stored {len(kept)} summaries in '{collection_name}' "
+          f"({sum(1 for r, _ in kept if r['metadata']['level'] == 'document')} document-level).")
+    return len(kept)
+
+
+def load_chunks(collection_name: str = COLLECTION_NAME) -> List[Dict]:
+    """Reads the leaf chunks of an ingested collection back out of the vector store."""
+    store = get_vector_store(collection_name)
+    chunks = []
+    for batch in store.iter_batches():
+        for chunk_id, document, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+            chunks.append({"id": chunk_id, "document": document, "metadata": metadata})
+    return chunks
+
+
+if __name__ == '__main__':
+    # Summaries are background work: keep interactive traffic first in line.
+    with request_priority(BATCH):
+        try:
+            build_summary_index(load_chunks())
+        except IncompleteEmbeddingError as e:
+            print(f"Error: {e}")
+            raise SystemExit(1)
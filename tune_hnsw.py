@@ -0,0 +1,165 @@
+"""
+tune_hnsw.py
+
+Sweeps ChromaDB HNSW parameters on our own data and reports the
+recall-vs-latency trade-off, to pick values for `VECTOR_STORE_SPACE` and the
+`CHROMA_HNSW_*` environment variables used when collections are created.
+
+For every combination of distance space, M and construction_ef it builds a
+temporary collection from the ingested embeddings (or synthetic vectors),
+then for every search_ef it measures:
+1.  Recall@k against an exact NumPy brute-force search.
+2.  Query latency (p50 / p95).
+3.  Build time.
+
+Rows on the recall/latency Pareto frontier are marked with '*'. Pass
+`--where` to measure filtered retrieval, e.g. `--where '{"content_type": "table"}'`.
+
+Usage:
+    python tune_hnsw.py
+    python tune_hnsw.py --M 8 16 32 --search-ef 10 50 100 --k 3
+    python tune_hnsw.py --synthetic 50000 --dim 1536 --space cosine
+"""
+import argparse
+import itertools
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_vector_store import load_source_data
+from utils.vector_store import ChromaVectorStore, MmapVectorStore
+
+TUNE_COLLECTION_NAME = "hnsw_tuning"
+ADD_BATCH_SIZE = 5000
+
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int, space: str, candidates: np.ndarray) -> list:
+    """Returns the exact top-k row indices among `candidates` for each query."""
+    subset = embeddings[candidates]
+    results = []
+    for query in queries:
+        dots = subset @ query
+        if space == "l2":
+            dist = (subset ** 2).sum(axis=1) - 2.0 * dots
+        elif space == "cosine":
+            dist = 1.0 - dots / np.maximum(np.linalg.norm(subset, axis=1) * np.linalg.norm(query), 1e-12)
+        else:
+            dist = 1.0 - dots
+        results.append(set(candidates[np.argsort(dist)[:k]].tolist()))
+    return results
+
+
+def build_collection(path: str, space: str, M: int, construction_ef: int, search_ef: int,
+                     ids, embeddings, documents, metadatas) -> ChromaVectorStore:
+    store = ChromaVectorStore(
+        TUNE_COLLECTION_NAME, path=path, create=True, space=space,
+        hnsw={"M": M, "construction_ef": construction_ef, "search_ef": search_ef},
+    )
+    for i in range(0, len(ids), ADD_BATCH_SIZE):
+        store.add(
+            ids=list(ids[i:i + ADD_BATCH_SIZE]),
+            embeddings=embeddings[i:i + ADD_BATCH_SIZE].tolist(),
+            documents=list(documents[i:i + ADD_BATCH_SIZE]),
+            metadatas=list(metadatas[i:i + ADD_BATCH_SIZE]),
+        )
+    return store
+
+
+def measure(store: ChromaVectorStore, queries: np.ndarray, k: int, where, truth: list, row_of: dict) -> dict:
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = store.query(query_embeddings=[query.tolist()], n_results=k, where=where)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {row_of[chunk_id] for chunk_id in result["ids"][0]})
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "recall": hits / (k * len(queries)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def candidate_rows(metadatas: list, where) -> np.ndarray:
+    """Rows matching `where`, evaluated with the mmap backend's filter logic."""
+    if not where:
+        return np.arange(len(metadatas))
+    work_dir = tempfile.mkdtemp(prefix="hnsw_filter_")
+    try:
+        store = MmapVectorStore("filter", path=work_dir, create=True)
+        store.add([str(i) for i in range(len(metadatas))], [[0.0]] * len(metadatas), [""] * len(metadatas), metadatas)
+        store.flush()
+        return store.matching_rows(where)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def sweep(args) -> None:
+    ids, embeddings, documents, metadatas = load_source_data(args.synthetic, args.dim)
+    if len(ids) == 0:
+        print("Error: No embeddings to tune on. Run 'ingest.py' or pass --synthetic.")
+        return
+    where = json.loads(args.where) if args.where else None
+    candidates = candidate_rows(metadatas, where)
+    if len(candidates) == 0:
+        print(f"Error: No chunks match the filter {where}.")
+        return
+
+    rng = np.random.default_rng(1)
+    picks = rng.choice(candidates, size=args.queries)
+    queries = embeddings[picks] + args.noise * rng.standard_normal((args.queries, embeddings.shape[1])).astype(np.float32)
+    row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+    print(f"Tuning on {len(ids)} vectors ({len(candidates)} matching filter), dimension {embeddings.shape[1]}, "
+          f"{args.queries} queries, k={args.k}.")
+
+    rows = []
+    for space in args.space:
+        truth = exact_top_k(embeddings, queries, args.k, space, candidates)
+        for M, construction_ef, search_ef in itertools.product(args.M, args.construction_ef, args.search_ef):
+            # Every search_ef gets a fresh build: changing it on a live
+            # collection (`collection.modify`) is accepted by ChromaDB but not
+            # applied to an index that is already loaded.
+            work_dir = tempfile.mkdtemp(prefix="hnsw_tuning_")
+            try:
+                start = time.perf_counter()
+                store = build_collection(work_dir, space, M, construction_ef, search_ef,
+                                         ids, embeddings, documents, metadatas)
+                build_seconds = time.perf_counter() - start
+                stats = measure(store, queries, args.k, where, truth, row_of)
+                rows.append(dict(stats, space=space, M=M, construction_ef=construction_ef,
+                                 search_ef=search_ef, build_s=build_seconds))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'':2}{'space':<8}{'M':>5}{'constr_ef':>11}{'search_ef':>11}{'build s':>10}"
+          f"{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in sorted(rows, key=lambda r: (r["space"], r["p50_ms"])):
+        dominated = any(
+            other is not row and other["space"] == row["space"]
+            and other["recall"] >= row["recall"] and other["p50_ms"] <= row["p50_ms"]
+            and (other["recall"] > row["recall"] or other["p50_ms"] < row["p50_ms"])
+            for other in rows
+        )
+        marker = " " if dominated else "*"
+        print(f"{marker:<2}{row['space']:<8}{row['M']:>5}{row['construction_ef']:>11}{row['search_ef']:>11}"
+              f"{row['build_s']:>10.2f}{row['recall']:>9.3f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep ChromaDB HNSW parameters and report recall vs latency.")
+    parser.add_argument("--space", nargs="+", default=["l2"], choices=["l2", "cosine", "ip"])
+    parser.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--k", type=int, default=3, help="Number of results per query (agent.py uses 3).")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--noise", type=float, default=0.05, help="Noise added to sampled vectors to form queries.")
+    parser.add_argument("--where", help="JSON metadata filter to apply to every query.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N random vectors instead of the ingested corpus.")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of synthetic vectors.")
+    args = parser.parse_args()
+
+    sweep(args)
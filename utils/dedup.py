@@ -0,0 +1,162 @@
+"""
+dedup.py
+
+Near-duplicate detection for text chunks using MinHash signatures and
+locality-sensitive hashing (LSH).
+
+The corpus repeats itself: the same report ships as both PDF and XLSX, the
+hybrid PDF scraper emits an OCR text blob alongside the tables of the same
+pages, and chunk overlap adds more. Embedding every copy costs API calls and
+index space, and retrieval then fills the context with near-identical chunks.
+
+Each chunk is reduced to a set of word shingles and a MinHash signature.
+Signatures are split into bands, and chunks that share any band become
+candidate pairs. Each candidate pair is confirmed with the signatures'
+estimated Jaccard similarity, and confirmed pairs are merged into clusters
+with union-find. One canonical chunk per cluster is kept; the sources of the
+others are recorded in its metadata, as flags that source filters match.
+"""
+import html
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils.vector_store import also_in_field
+
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 128
+NUM_BANDS = 16  # 16 bands x 8 rows: pairs above ~0.7 similarity become candidates.
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    Hashes the word shingles of a text, ignoring case, punctuation and HTML
+    markup (tables are stored as HTML).
+
+    Returns:
+        The unique 32-bit shingle hashes as a uint64 array.
+    """
+    words = _WORD_RE.findall(html.unescape(_TAG_RE.sub(" ", text)).lower())
+    if len(words) < size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with `num_perm` random hash permutations.
+
+    Attributes:
+        num_perm: The signature length.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        self.num_perm = num_perm
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text)
+        # uint64 arithmetic wraps on overflow; that is fine for hashing.
+        with np.errstate(over="ignore"):
+            permuted = ((self._a * hashes + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=1)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_near_duplicates(texts: List[str], threshold: float = DEFAULT_THRESHOLD,
+                            num_perm: int = NUM_PERM, num_bands: int = NUM_BANDS) -> List[List[int]]:
+    """
+    Groups texts whose estimated Jaccard similarity is at least `threshold`.
+
+    Args:
+        texts: The texts to compare.
+        threshold: Minimum estimated similarity for two texts to be merged.
+        num_perm: MinHash signature length. Must be divisible by `num_bands`.
+        num_bands: Number of LSH bands.
+
+    Returns:
+        Clusters of indices into `texts`, including singletons.
+    """
+    if not texts:
+        return []
+    hasher = MinHasher(num_perm)
+    signatures = np.stack([hasher.signature(text) for text in texts])
+    rows = num_perm // num_bands
+
+    parent = list(range(len(texts)))
+    for band in range(num_bands):
+        buckets: Dict[bytes, List[int]] = {}
+        for i, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets.setdefault(key.tobytes(), []).append(i)
+        for members in buckets.values():
+            # Link each member to the first earlier member it really resembles.
+            for n, i in enumerate(members[1:], start=1):
+                for j in members[:n]:
+                    root_i, root_j = _find(parent, i), _find(parent, j)
+                    if root_i == root_j:
+                        break
+                    if np.mean(signatures[i] == signatures[j]) >= threshold:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+                        break
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(_find(parent, i), []).append(i)
+    return list(clusters.values())
+
+
+def deduplicate_chunks(chunks: List[Dict], threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[Dict], int]:
+    """
+    Keeps one canonical chunk per near-duplicate cluster.
+
+    The canonical chunk is the longest one (ties broken by id, so reruns are
+    stable). It gains these metadata fields:
+        duplicate_count: how many chunks were folded into it.
+        duplicate_sources: the other files they came from, comma-separated.
+        also_in:<file>: True for each of those files, so that a filter on
+            that source still finds the content (see `retriever.build_where`).
+
+    Args:
+        chunks: Dicts with "id", "document" and "metadata", as produced by
+            `ingest.extract_chunks`.
+        threshold: Minimum estimated Jaccard similarity to count as a duplicate.
+
+    Returns:
+        A tuple of (kept chunks in their original order, number removed).
+    """
+    clusters = cluster_near_duplicates([chunk["document"] for chunk in chunks], threshold)
+    kept = []
+    for members in clusters:
+        canonical = min(members, key=lambda i: (-len(chunks[i]["document"]), chunks[i]["id"]))
+        if len(members) > 1:
+            own_source = chunks[canonical]["metadata"].get("source")
+            other_sources = sorted({
+                chunks[i]["metadata"].get("source") for i in members
+                if i != canonical and chunks[i]["metadata"].get("source") not in (None, own_source)
+            })
+            metadata = dict(chunks[canonical]["metadata"], duplicate_count=len(members) - 1)
+            if other_sources:
+                metadata["duplicate_sources"] = ",".join(other_sources)
+                metadata.update({also_in_field(source): True for source in other_sources})
+            chunks[canonical] = dict(chunks[canonical], metadata=metadata)
+        kept.append(canonical)
+    kept.sort()
+    return [chunks[i] for i in kept], len(chunks) - len(kept)
@@ -3,15 +3,41 @@ llm.py
 
 A utility module for interacting with a LangChain LLM.
 This provides a simple function to get a response from a pre-initialized model.
+
+Identical concurrent calls are coalesced: while a completion or embedding for
+a given (model, input, params) key is in flight, further callers with the
+same key wait for that call and share its result rather than issuing their
+own. See `utils/singleflight.py` and `coalescing_stats()`.
+
+Every upstream call first acquires capacity from the shared, priority-aware
+OpenAI rate-limit scheduler in `utils/rate_limiter.py`.
+
+`get_routed_response` puts a tiered router in front of `get_response`. It
+picks a tier (model, `max_tokens` and endpoint) from features of the prompt
+and an optional latency budget. If the chosen tier errors, times out, or is
+still running when its hedge delay expires, the tier's fallback is started
+too, and the first good answer wins. Tier latency estimates start from
+configured values and are refined by measured calls. Per-tier latency and
+token usage are reported by `tier_stats()`.
 """
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.messages import HumanMessage
 from langchain_core.outputs import LLMResult
-from typing import List
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from typing import Dict, List, Optional
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
 
+from utils.rate_limiter import estimate_tokens, scheduler
+from utils.singleflight import SingleFlight
+
 load_dotenv()  
 
 llm = ChatOpenAI(
@@ -19,6 +45,7 @@ llm = ChatOpenAI(
     temperature=0.2,
     max_tokens=500,
     streaming=False,
+    include_response_headers=True,
     api_key=os.getenv("OPENAI_API_KEY")
 )
 
@@ -27,6 +54,121 @@ embedding_model = OpenAIEmbeddings(
     api_key=os.getenv("OPENAI_API_KEY")
 )
 
+# Returned by `get_response` / `aget_response` when the model call fails.
+FAILED_RESPONSE = "Sorry, I was unable to get a response from the model."
+
+# Attempts `embed_texts` makes before giving up on a batch that keeps hitting
+# rate limits (429) or transient errors (timeouts, connection errors, 5xx).
+EMBED_MAX_ATTEMPTS = int(os.getenv("OPENAI_EMBED_MAX_ATTEMPTS", "6"))
+# Upper bound on the wait between attempts after a transient error.
+EMBED_MAX_RETRY_WAIT = 30.0
+
+
+class IncompleteEmbeddingError(RuntimeError):
+    """Raised by bulk jobs (ingest, summaries) when some texts could not be embedded."""
+
+# --- Tiered routing ---
+# Tiers from fastest/cheapest to most capable. Every setting can be
+# overridden with LLM_<TIER>_MODEL, _MAX_TOKENS, _BASE_URL (an
+# OpenAI-compatible endpoint; default: the OpenAI API), _TIMEOUT (seconds
+# before a call counts as failed) and _EXPECTED_LATENCY (seconds, the prior
+# that the tier's measured latencies refine, see `expected_latency`).
+TIER_ORDER = ["fast", "default", "long"]
+_TIER_DEFAULTS = {
+    "fast": {"model": "gpt-3.5-turbo", "max_tokens": 256, "timeout": 10.0, "expected_latency": 2.0, "fallback": "default"},
+    "default": {"model": "gpt-3.5-turbo", "max_tokens": 500, "timeout": 30.0, "expected_latency": 5.0, "fallback": "fast"},
+    "long": {"model": "gpt-4o-mini", "max_tokens": 1200, "timeout": 60.0, "expected_latency": 15.0, "fallback": "default"},
+}
+LLM_TIERS = {
+    name: {
+        "model": os.getenv(f"LLM_{name.upper()}_MODEL", defaults["model"]),
+        "max_tokens": int(os.getenv(f"LLM_{name.upper()}_MAX_TOKENS", str(defaults["max_tokens"]))),
+        "base_url": os.getenv(f"LLM_{name.upper()}_BASE_URL") or None,
+        "timeout": float(os.getenv(f"LLM_{name.upper()}_TIMEOUT", str(defaults["timeout"]))),
+        "expected_latency": float(os.getenv(f"LLM_{name.upper()}_EXPECTED_LATENCY", str(defaults["expected_latency"]))),
+        "fallback": defaults["fallback"],
+    }
+    for name, defaults in _TIER_DEFAULTS.items()
+}
+# Each routed request can hold two calls (first tier and fallback) at once.
+ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "64"))
+# Weight of a tier's configured latency, in measured calls, when blended with its measured p95.
+LATENCY_PRIOR_WEIGHT = 3
+# Every Nth request that skips a tier because it is expected to miss the
+# deadline is sent to that tier anyway, so its estimate keeps being measured.
+PROBE_EVERY = int(os.getenv("LLM_ROUTER_PROBE_EVERY", "10"))
+# Long-form requests are never routed to a tier with a smaller output budget
+# than this (by default, that of the single `llm` model) unless asked to.
+LONG_OUTPUT_MIN_TOKENS = int(os.getenv("LLM_LONG_OUTPUT_MIN_TOKENS", str(llm.max_tokens)))
+# Prompts (routing text) up to this many tokens can go to the fast tier.
+SHORT_PROMPT_TOKENS = 64
+# Full prompts above this many tokens go to the long tier.
+LONG_PROMPT_TOKENS = 3000
+
+# Requests that ask for long-form output.
+LONG_OUTPUT_PATTERN = re.compile(
+    r"\b(user stor(y|ies)|acceptance criteria|epics?|detailed|in detail|step[- ]by[- ]step|"
+    r"report|draft|write[- ]up|specification)\b",
+    re.IGNORECASE,
+)
+# Short factual questions a small model with a small output budget can answer.
+LOOKUP_PATTERN = re.compile(r"^\s*(what|which|who|when|where|is|are|was|were|does|did|how (much|many))\b", re.IGNORECASE)
+
+tier_llms = {
+    name: ChatOpenAI(
+        model=tier["model"],
+        temperature=0.2,
+        max_tokens=tier["max_tokens"],
+        streaming=False,
+        include_response_headers=True,
+        timeout=tier["timeout"],
+        max_retries=0,  # The router's fallback takes the place of retries.
+        base_url=tier["base_url"],
+        api_key=os.getenv("OPENAI_API_KEY")
+    )
+    for name, tier in LLM_TIERS.items()
+}
+
+_stats_lock = threading.Lock()
+_token_usage: Dict[int, Dict[str, int]] = {}  # Keyed by id() of the ChatOpenAI instance.
+_tier_calls = {
+    name: {"calls": 0, "failures": 0, "fallbacks": 0, "served": 0, "skipped": 0, "probes": 0,
+           "latencies": deque(maxlen=1000)}
+    for name in LLM_TIERS
+}
+_router_pool = None
+_router_pool_pid = None
+
+_response_flight = SingleFlight("get_response")
+_embedding_flight = SingleFlight("embed_text")
+
+
+def _response_key(user_prompt: str, llm: ChatOpenAI) -> tuple:
+    return (llm.model_name, llm.openai_api_base, llm.temperature, llm.max_tokens, user_prompt)
+
+
+def _embedding_key(text: str, embedding_model: OpenAIEmbeddings) -> tuple:
+    return (embedding_model.model, embedding_model.openai_api_base, embedding_model.dimensions, text)
+
+
+def _estimate_chat_tokens(user_prompt: str, llm: ChatOpenAI) -> int:
+    return estimate_tokens(user_prompt) + (llm.max_tokens or 0)
+
+
+def _observe_chat_result(result: LLMResult, estimated_tokens: int, llm: ChatOpenAI) -> None:
+    """Feeds rate-limit headers and actual token usage back to the scheduler."""
+    generation = result.generations[0][0]
+    message = getattr(generation, "message", None)
+    if message is not None:
+        scheduler.observe_headers("chat", message.response_metadata.get("headers"))
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    scheduler.record_usage("chat", estimated_tokens, usage.get("total_tokens"))
+    with _stats_lock:
+        totals = _token_usage.setdefault(id(llm), {"prompt_tokens": 0, "completion_tokens": 0})
+        totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        totals["completion_tokens"] += usage.get("completion_tokens") or 0
+
+
 def get_response(user_prompt: str, llm: ChatOpenAI = llm) -> str:
     """
     Gets a response from the provided LangChain ChatOpenAI model.
@@ -42,14 +184,251 @@ def get_response(user_prompt: str, llm: ChatOpenAI = llm) -> str:
         raise TypeError("The 'llm' parameter must be an instance of ChatOpenAI.")
     
     messages = [HumanMessage(content=user_prompt)]
-    
-    try:
-        result: LLMResult = llm.generate([messages])
-        response_content = result.generations[0][0].text
-        return response_content
-    except Exception as e:
-        print(f"An error occurred while communicating with the LLM: {e}")
-        return "Sorry, I was unable to get a response from the model."
+
+    def _call() -> str:
+        estimated_tokens = _estimate_chat_tokens(user_prompt, llm)
+        scheduler.acquire("chat", estimated_tokens)
+        try:
+            result: LLMResult = llm.generate([messages])
+            _observe_chat_result(result, estimated_tokens, llm)
+            response_content = result.generations[0][0].text
+            return response_content
+        except RateLimitError as e:
+            backoff = scheduler.on_rate_limited("chat", e.response.headers)
+            print(f"The LLM rate limit was hit; backing off chat traffic for {backoff:.1f}s.")
+            return FAILED_RESPONSE
+        except Exception as e:
+            print(f"An error occurred while communicating with the LLM: {e}")
+            return FAILED_RESPONSE
+
+    return _response_flight.do(_response_key(user_prompt, llm), _call)
+
+
+async def aget_response(user_prompt: str, llm: ChatOpenAI = llm) -> str:
+    """
+    Async version of `get_response`. Coalesces with concurrent sync and
+    async callers that use the same prompt and model settings.
+    """
+    if not isinstance(llm, ChatOpenAI):
+        raise TypeError("The 'llm' parameter must be an instance of ChatOpenAI.")
+
+    messages = [HumanMessage(content=user_prompt)]
+
+    async def _call() -> str:
+        estimated_tokens = _estimate_chat_tokens(user_prompt, llm)
+        await scheduler.aacquire("chat", estimated_tokens)
+        try:
+            result: LLMResult = await llm.agenerate([messages])
+            _observe_chat_result(result, estimated_tokens, llm)
+            return result.generations[0][0].text
+        except RateLimitError as e:
+            backoff = scheduler.on_rate_limited("chat", e.response.headers)
+            print(f"The LLM rate limit was hit; backing off chat traffic for {backoff:.1f}s.")
+            return FAILED_RESPONSE
+        except Exception as e:
+            print(f"An error occurred while communicating with the LLM: {e}")
+            return FAILED_RESPONSE
+
+    return await _response_flight.do_async(_response_key(user_prompt, llm), _call)
+
+
+def _get_router_pool() -> ThreadPoolExecutor:
+    """Returns this process's router pool (threads do not survive a fork)."""
+    global _router_pool, _router_pool_pid
+    if _router_pool is None or _router_pool_pid != os.getpid():
+        _router_pool = ThreadPoolExecutor(max_workers=ROUTER_WORKERS, thread_name_prefix="llm-router")
+        _router_pool_pid = os.getpid()
+    return _router_pool
+
+
+def _percentile(ordered: List[float], p: float) -> Optional[float]:
+    return ordered[int(p * (len(ordered) - 1))] if ordered else None
+
+
+def prompt_features(routing_text: str, prompt: str) -> Dict:
+    """The prompt features `choose_tier` routes on."""
+    return {
+        "routing_tokens": estimate_tokens(routing_text),
+        "prompt_tokens": estimate_tokens(prompt),
+        "long_output": bool(LONG_OUTPUT_PATTERN.search(routing_text)),
+        "lookup": bool(LOOKUP_PATTERN.search(routing_text)),
+    }
+
+
+def expected_latency(tier: str) -> float:
+    """
+    The tier's expected p95 latency: its configured estimate, counted as
+    `LATENCY_PRIOR_WEIGHT` calls, blended with the p95 of its measured calls.
+    """
+    with _stats_lock:
+        latencies = sorted(_tier_calls[tier]["latencies"])
+    return _blend_latency(LLM_TIERS[tier]["expected_latency"], latencies)
+
+
+def _blend_latency(prior: float, ordered: List[float]) -> float:
+    if not ordered:
+        return prior
+    return (LATENCY_PRIOR_WEIGHT * prior + len(ordered) * _percentile(ordered, 0.95)) / (LATENCY_PRIOR_WEIGHT + len(ordered))
+
+
+def _fallback_tier(tier: str, min_tokens: int = 0) -> Optional[str]:
+    """
+    The tier to fall back to from `tier`: its configured fallback, or else the
+    first other tier with at least `min_tokens` of output. None if there is none.
+    """
+    fallback = LLM_TIERS[tier]["fallback"]
+    if LLM_TIERS[fallback]["max_tokens"] >= min_tokens:
+        return fallback
+    return next((name for name in TIER_ORDER if name != tier and LLM_TIERS[name]["max_tokens"] >= min_tokens), None)
+
+
+def _should_probe(tier: str, deadline_s: float, min_tokens: int) -> bool:
+    """
+    Whether to send a request to a tier expected to miss the deadline anyway,
+    to measure it. Only done when its fallback is expected to fit the deadline,
+    so a slow probe is still answered in time.
+    """
+    fallback = _fallback_tier(tier, min_tokens)
+    if PROBE_EVERY <= 0 or fallback is None or expected_latency(fallback) >= deadline_s:
+        return False
+    with _stats_lock:
+        calls = _tier_calls[tier]
+        calls["skipped"] += 1
+        if calls["skipped"] % PROBE_EVERY:
+            return False
+        calls["probes"] += 1
+    return True
+
+
+def choose_tier(prompt: str, routing_text: Optional[str] = None, deadline_s: Optional[float] = None) -> str:
+    """
+    Picks the tier for a prompt: "long" for long-form output or very long
+    prompts, "fast" for short lookups, "default" otherwise. With a deadline,
+    steps down to faster tiers until the expected latency fits, but never to
+    one with less than `LONG_OUTPUT_MIN_TOKENS` of output for a long-form
+    request. Every `PROBE_EVERY`th request that steps past a tier is sent to
+    it instead (see `_should_probe`).
+
+    Args:
+        prompt: The full prompt that will be sent.
+        routing_text: The text to read the request's intent from (e.g. the
+            user's own request inside a RAG prompt). Defaults to `prompt`.
+        deadline_s: Latency budget in seconds.
+
+    Returns:
+        A tier name from `LLM_TIERS`.
+    """
+    features = prompt_features(routing_text or prompt, prompt)
+    if features["long_output"] or features["prompt_tokens"] > LONG_PROMPT_TOKENS:
+        preferred = "long"
+    elif features["lookup"] and features["routing_tokens"] <= SHORT_PROMPT_TOKENS:
+        preferred = "fast"
+    else:
+        preferred = "default"
+    if deadline_s is None:
+        return preferred
+
+    min_tokens = LONG_OUTPUT_MIN_TOKENS if features["long_output"] else 0
+    candidates = [
+        tier for tier in TIER_ORDER[:TIER_ORDER.index(preferred) + 1]
+        if LLM_TIERS[tier]["max_tokens"] >= min_tokens
+    ] or [preferred]
+    for tier in reversed(candidates):
+        if expected_latency(tier) <= deadline_s or _should_probe(tier, deadline_s, min_tokens):
+            return tier
+    return candidates[0]
+
+
+def _call_tier(tier: str, user_prompt: str) -> str:
+    start = time.monotonic()
+    response = get_response(user_prompt=user_prompt, llm=tier_llms[tier])
+    elapsed = time.monotonic() - start
+    with _stats_lock:
+        calls = _tier_calls[tier]
+        calls["calls"] += 1
+        calls["latencies"].append(elapsed)
+        if response == FAILED_RESPONSE:
+            calls["failures"] += 1
+    return response
+
+
+def get_routed_response(user_prompt: str, routing_text: Optional[str] = None, deadline_s: Optional[float] = None,
+                        hedge_s: Optional[float] = None, tier: Optional[str] = None) -> str:
+    """
+    Gets a response from the tier best suited to the prompt, falling back to
+    the tier's fallback on error, timeout or hedge delay.
+
+    Args:
+        user_prompt: The full prompt to send.
+        routing_text: The text to read the request's intent from. Defaults
+            to `user_prompt`.
+        deadline_s: Latency budget in seconds. The tier is chosen to fit it,
+            the fallback (if it is expected to fit) is started in time to
+            finish within it, and once it has passed FAILED_RESPONSE is
+            returned. Calls still running then finish in the background.
+        hedge_s: Start the fallback if the first tier has not answered after
+            this many seconds, and use whichever answers first.
+        tier: Use this tier instead of choosing one. Its configured fallback
+            is used as is, even for a long-form request.
+
+    Returns:
+        The first successful response, or FAILED_RESPONSE.
+
+    Raises:
+        ValueError: If `tier` is unknown, or `deadline_s` is not positive or
+            `hedge_s` negative.
+    """
+    if tier is not None and tier not in LLM_TIERS:
+        raise ValueError(f"Unknown LLM tier '{tier}'. Available: {', '.join(TIER_ORDER)}.")
+    if deadline_s is not None and deadline_s <= 0:
+        raise ValueError(f"deadline_s must be positive, got {deadline_s}.")
+    if hedge_s is not None and hedge_s < 0:
+        raise ValueError(f"hedge_s must not be negative, got {hedge_s}.")
+
+    primary = tier or choose_tier(user_prompt, routing_text, deadline_s)
+    long_output = tier is None and bool(LONG_OUTPUT_PATTERN.search(routing_text or user_prompt))
+    secondary = _fallback_tier(primary, LONG_OUTPUT_MIN_TOKENS if long_output else 0)
+    if secondary is None:
+        hedge_s = None
+    elif deadline_s is not None and expected_latency(secondary) < deadline_s:
+        # Start the fallback no later than it needs to still finish in time.
+        latest_hedge = deadline_s - expected_latency(secondary)
+        hedge_s = latest_hedge if hedge_s is None else min(hedge_s, latest_hedge)
+
+    # Each call runs in a copy of this context so the caller's request priority applies.
+    pool = _get_router_pool()
+    start = time.monotonic()
+    pending = {pool.submit(contextvars.copy_context().run, _call_tier, primary, user_prompt): primary}
+    fallback_started = False
+    while pending:
+        elapsed = time.monotonic() - start
+        timeouts = []
+        if deadline_s is not None:
+            timeouts.append(deadline_s - elapsed)
+        if hedge_s is not None and not fallback_started:
+            timeouts.append(hedge_s - elapsed)
+        done, _ = wait(pending, timeout=max(0.0, min(timeouts)) if timeouts else None, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            served_by = pending.pop(future)
+            response = future.result()
+            if response != FAILED_RESPONSE:
+                with _stats_lock:
+                    _tier_calls[served_by]["served"] += 1
+                return response
+
+        elapsed = time.monotonic() - start
+        if deadline_s is not None and elapsed >= deadline_s:
+            print(f"No LLM tier answered within the {deadline_s:.1f}s deadline.")
+            break
+        # Start the fallback once the first tier has failed or its hedge delay has passed.
+        if secondary is not None and not fallback_started and (done or (hedge_s is not None and elapsed >= hedge_s)):
+            fallback_started = True
+            print(f"Starting fallback tier '{secondary}' for tier '{primary}' after {elapsed:.2f}s.")
+            with _stats_lock:
+                _tier_calls[secondary]["fallbacks"] += 1
+            pending[pool.submit(contextvars.copy_context().run, _call_tier, secondary, user_prompt)] = secondary
+    return FAILED_RESPONSE
 
 
 def embed_text(text: str, embedding_model: OpenAIEmbeddings = embedding_model) -> List[float]:
@@ -65,13 +444,126 @@ def embed_text(text: str, embedding_model: OpenAIEmbeddings = embedding_model) -
     """
     if not isinstance(embedding_model, OpenAIEmbeddings):
         raise TypeError("The 'embedding_model' parameter must be an instance of OpenAIEmbeddings.")
-    
-    try:
-        return embedding_model.embed_query(text)
-    except Exception as e:
-        print(f"An error occurred while creating the embedding: {e}")
+
+    def _call() -> List[float]:
+        scheduler.acquire("embedding", estimate_tokens(text))
+        try:
+            return embedding_model.embed_query(text)
+        except RateLimitError as e:
+            backoff = scheduler.on_rate_limited("embedding", e.response.headers)
+            print(f"The embeddings rate limit was hit; backing off embedding traffic for {backoff:.1f}s.")
+            return []
+        except Exception as e:
+            print(f"An error occurred while creating the embedding: {e}")
+            return []
+
+    # Coalesced callers share one result, so each gets its own copy.
+    return list(_embedding_flight.do(_embedding_key(text, embedding_model), _call))
+
+
+def embed_texts(texts: List[str], embedding_model: OpenAIEmbeddings = embedding_model) -> List[List[float]]:
+    """
+    Generates embeddings for a batch of texts in a single request. Used for
+    bulk work such as ingestion, where batching cuts request overhead; the
+    calls are rate-limited but not coalesced. A batch that hits a rate limit
+    or a transient error is retried, up to `EMBED_MAX_ATTEMPTS` attempts.
+
+    Args:
+        texts: The texts to embed.
+        embedding_model: An initialized instance of OpenAIEmbeddings.
+
+    Returns:
+        One embedding per text, in order. Empty lists mark texts that could
+        not be embedded (a non-retryable error, or every attempt failed).
+    """
+    if not isinstance(embedding_model, OpenAIEmbeddings):
+        raise TypeError("The 'embedding_model' parameter must be an instance of OpenAIEmbeddings.")
+    if not texts:
         return []
 
+    tokens = sum(estimate_tokens(text) for text in texts)
+    for attempt in range(1, EMBED_MAX_ATTEMPTS + 1):
+        # After a 429 this blocks until the scheduler's backoff has passed.
+        scheduler.acquire("embedding", tokens)
+        try:
+            return embedding_model.embed_documents(texts)
+        except RateLimitError as e:
+            backoff = scheduler.on_rate_limited("embedding", e.response.headers)
+            print(f"The embeddings rate limit was hit; backing off embedding traffic for {backoff:.1f}s "
+                  f"(attempt {attempt}/{EMBED_MAX_ATTEMPTS}).")
+        except (APIConnectionError, InternalServerError) as e:
+            wait_s = min(EMBED_MAX_RETRY_WAIT, 2.0 ** attempt)
+            print(f"A transient error occurred while creating the embeddings: {e}; "
+                  f"retrying in {wait_s:.0f}s (attempt {attempt}/{EMBED_MAX_ATTEMPTS}).")
+            if attempt < EMBED_MAX_ATTEMPTS:
+                time.sleep(wait_s)
+        except Exception as e:
+            # Not retryable (e.g. an invalid request): retrying would fail the same way.
+            print(f"An error occurred while creating the embeddings: {e}")
+            break
+    return [[] for _ in texts]
+
+
+async def aembed_text(text: str, embedding_model: OpenAIEmbeddings = embedding_model) -> List[float]:
+    """
+    Async version of `embed_text`. Coalesces with concurrent sync and async
+    callers embedding the same text with the same model.
+    """
+    if not isinstance(embedding_model, OpenAIEmbeddings):
+        raise TypeError("The 'embedding_model' parameter must be an instance of OpenAIEmbeddings.")
+
+    async def _call() -> List[float]:
+        await scheduler.aacquire("embedding", estimate_tokens(text))
+        try:
+            return await embedding_model.aembed_query(text)
+        except RateLimitError as e:
+            backoff = scheduler.on_rate_limited("embedding", e.response.headers)
+            print(f"The embeddings rate limit was hit; backing off embedding traffic for {backoff:.1f}s.")
+            return []
+        except Exception as e:
+            print(f"An error occurred while creating the embedding: {e}")
+            return []
+
+    return list(await _embedding_flight.do_async(_embedding_key(text, embedding_model), _call))
+
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Returns in-flight coalescing counters for completions and embeddings:
+    how many upstream calls were made and how many callers were served by
+    attaching to an identical call already in flight.
+    """
+    return {flight.name: flight.stats() for flight in (_response_flight, _embedding_flight)}
+
+
+def tier_stats() -> Dict[str, Dict]:
+    """
+    Returns per-tier routing metrics: upstream calls, failures (errors and
+    timeouts), how often the tier was started as a fallback, how many
+    requests it answered, how many requests were sent to it as probes, p50/p95
+    call latency over the last 1000 calls, the latency `choose_tier` currently
+    expects and the tokens it used.
+    """
+    with _stats_lock:
+        stats = {}
+        for name, calls in _tier_calls.items():
+            latencies = sorted(calls["latencies"])
+            usage = _token_usage.get(id(tier_llms[name]), {})
+            stats[name] = {
+                "model": LLM_TIERS[name]["model"],
+                "calls": calls["calls"],
+                "failures": calls["failures"],
+                "fallbacks": calls["fallbacks"],
+                "served": calls["served"],
+                "probes": calls["probes"],
+                "p50_latency_s": _percentile(latencies, 0.50),
+                "p95_latency_s": _percentile(latencies, 0.95),
+                "expected_latency_s": _blend_latency(LLM_TIERS[name]["expected_latency"], latencies),
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+            }
+        return stats
+
 
 if __name__ == '__main__':
     # This is an example of how to use the get_response function with a real API key.
@@ -0,0 +1,35 @@
+"""
+metrics.py
+
+Lightweight, dependency-free process metrics used by the API's `/stats`
+endpoint and the benchmark scripts.
+"""
+import os
+from typing import Dict
+
+
+def process_memory_kb() -> Dict[str, int]:
+    """
+    Returns the memory usage of the current process in KB.
+
+    `rss` is the resident set size. `shared` is the part of it backed by pages
+    that other processes may also map (e.g. the memory-mapped index or
+    copy-on-write pages inherited from a pre-fork parent), and `private` is
+    the part owned by this process alone. The breakdown requires Linux's
+    `/proc/self/smaps_rollup`; elsewhere only the peak RSS is reported.
+    """
+    usage = {"pid": os.getpid(), "rss": 0, "shared": 0, "private": 0}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                field, value = line.split(":", 1)
+                if field == "Rss":
+                    usage["rss"] = int(value.split()[0])
+                elif field in ("Shared_Clean", "Shared_Dirty"):
+                    usage["shared"] += int(value.split()[0])
+                elif field in ("Private_Clean", "Private_Dirty"):
+                    usage["private"] += int(value.split()[0])
+    except (OSError, ValueError):
+        import resource
+        usage["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
@@ -0,0 +1,305 @@
+"""
+rate_limiter.py
+
+A priority-aware token-bucket scheduler for all OpenAI traffic.
+
+Every chat and embedding call acquires capacity from two buckets per kind of
+traffic, one for requests per minute (RPM) and one for tokens per minute
+(TPM), before it is sent. The bucket state lives in a small JSON file guarded
+by an exclusive file lock, so the API workers, the MCP server and `ingest.py`
+all draw from one budget even when they run as separate processes.
+
+Priorities:
+-   INTERACTIVE (the default) may use the whole budget.
+-   BATCH (set by `ingest.py` via `request_priority(BATCH)`) may not draw
+    the buckets below a reserved fraction of their capacity, and yields
+    entirely while an interactive caller in any process is waiting.
+
+Backoff: a 429 response blocks the affected kind of traffic for every
+process, for the server's `retry-after` interval or an exponential backoff,
+and `x-ratelimit-remaining-*` headers pull the local buckets down to what
+the server reports.
+
+Limits are configured with environment variables (defaults in parentheses):
+    OPENAI_CHAT_RPM (3500), OPENAI_CHAT_TPM (90000),
+    OPENAI_EMBEDDING_RPM (3000), OPENAI_EMBEDDING_TPM (1000000),
+    OPENAI_RATE_LIMIT_BATCH_RESERVE (0.2),
+    OPENAI_RATE_LIMIT_STATE (a file in the system temp directory).
+"""
+import asyncio
+import contextvars
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Mapping, Optional
+
+INTERACTIVE = 0
+BATCH = 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_LIMITS = {
+    "chat": {
+        "rpm": float(os.getenv("OPENAI_CHAT_RPM", "3500")),
+        "tpm": float(os.getenv("OPENAI_CHAT_TPM", "90000")),
+    },
+    "embedding": {
+        "rpm": float(os.getenv("OPENAI_EMBEDDING_RPM", "3000")),
+        "tpm": float(os.getenv("OPENAI_EMBEDDING_TPM", "1000000")),
+    },
+}
+BATCH_RESERVE = float(os.getenv("OPENAI_RATE_LIMIT_BATCH_RESERVE", "0.2"))
+STATE_FILE = os.getenv(
+    "OPENAI_RATE_LIMIT_STATE",
+    os.path.join(tempfile.gettempdir(), "agents_sandbox_openai_rate_limit.json"),
+)
+# How long an interactive caller's "I am waiting" signal makes batch callers yield.
+INTERACTIVE_HOLD_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+_POLL_SECONDS = 0.25
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("openai_request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Runs the enclosed OpenAI calls at the given priority (INTERACTIVE or BATCH)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parses OpenAI reset/retry durations such as '20ms', '1.5s' or '6m0s'."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = re.findall(r"([\d.]+)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+class RateLimitScheduler:
+    """
+    Shares RPM/TPM token buckets for chat and embedding traffic across
+    threads and processes. See the module docstring for the policy.
+    """
+
+    def __init__(self, state_file: str = STATE_FILE, limits: Dict = None,
+                 batch_reserve: float = BATCH_RESERVE):
+        self.state_file = state_file
+        self.limits = limits or _LIMITS
+        self.batch_reserve = batch_reserve
+        self._thread_lock = threading.Lock()
+        self._waits: Dict[tuple, deque] = {}
+        self._wait_totals: Dict[tuple, list] = {}
+
+    # --- Shared state ---
+
+    @contextmanager
+    def _state(self):
+        """Yields the shared state dict under an exclusive lock and saves it afterwards."""
+        with self._thread_lock:
+            with open(self.state_file + ".lock", "a") as lock:
+                try:
+                    import fcntl
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                except ImportError:  # Windows: the budget is shared within this process only.
+                    pass
+                try:
+                    with open(self.state_file, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                yield state
+                tmp_file = f"{self.state_file}.{os.getpid()}.tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_file, self.state_file)
+
+    def _bucket(self, state: Dict, kind: str, now: float) -> Dict:
+        """Returns the refilled bucket for `kind`, creating it full if missing."""
+        limits = self.limits[kind]
+        bucket = state.setdefault(kind, {
+            "requests": limits["rpm"],
+            "tokens": limits["tpm"],
+            "updated": now,
+            "blocked_until": 0.0,
+            "interactive_until": 0.0,
+            "failures": 0,
+        })
+        elapsed = max(0.0, now - bucket["updated"])
+        bucket["requests"] = min(limits["rpm"], bucket["requests"] + elapsed * limits["rpm"] / 60.0)
+        bucket["tokens"] = min(limits["tpm"], bucket["tokens"] + elapsed * limits["tpm"] / 60.0)
+        bucket["updated"] = now
+        return bucket
+
+    def _try_acquire(self, kind: str, tokens: int, priority: int) -> float:
+        """
+        Takes one request and `tokens` tokens if allowed.
+
+        Returns:
+            0.0 if acquired, otherwise the estimated seconds until it could be.
+        """
+        limits = self.limits[kind]
+        # A single call larger than the whole budget is allowed through once
+        # the bucket is full, rather than waiting forever.
+        tokens = min(tokens, limits["tpm"])
+        now = time.time()
+        with self._state() as state:
+            bucket = self._bucket(state, kind, now)
+            if now < bucket["blocked_until"]:
+                return bucket["blocked_until"] - now
+
+            reserve = 0.0
+            if priority == BATCH:
+                if now < bucket["interactive_until"]:
+                    return bucket["interactive_until"] - now
+                reserve = self.batch_reserve
+
+            floor_requests = reserve * limits["rpm"]
+            floor_tokens = reserve * limits["tpm"]
+            missing_requests = floor_requests + 1 - bucket["requests"]
+            missing_tokens = min(floor_tokens + tokens, limits["tpm"]) - bucket["tokens"]
+            if missing_requests <= 0 and missing_tokens <= 0:
+                bucket["requests"] -= 1
+                bucket["tokens"] -= tokens
+                return 0.0
+
+            if priority == INTERACTIVE:
+                bucket["interactive_until"] = now + INTERACTIVE_HOLD_SECONDS
+            return max(
+                missing_requests * 60.0 / limits["rpm"],
+                missing_tokens * 60.0 / limits["tpm"],
+                0.001,
+            )
+
+    # --- Public API ---
+
+    def acquire(self, kind: str, tokens: int, priority: Optional[int] = None) -> float:
+        """
+        Blocks until one request and `tokens` tokens of `kind` traffic may be
+        sent.
+
+        Returns:
+            The seconds spent waiting in the queue.
+        """
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        while True:
+            wait = self._try_acquire(kind, tokens, priority)
+            if wait == 0.0:
+                break
+            time.sleep(min(wait, _POLL_SECONDS))
+        waited = time.monotonic() - start
+        self._record_wait(kind, priority, waited)
+        return waited
+
+    async def aacquire(self, kind: str, tokens: int, priority: Optional[int] = None) -> float:
+        """Async version of `acquire`."""
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        while True:
+            wait = self._try_acquire(kind, tokens, priority)
+            if wait == 0.0:
+                break
+            await asyncio.sleep(min(wait, _POLL_SECONDS))
+        waited = time.monotonic() - start
+        self._record_wait(kind, priority, waited)
+        return waited
+
+    def record_usage(self, kind: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Returns over-estimated tokens to the bucket (or charges the shortfall)."""
+        if actual_tokens is None:
+            return
+        with self._state() as state:
+            bucket = self._bucket(state, kind, time.time())
+            bucket["tokens"] = min(self.limits[kind]["tpm"], bucket["tokens"] + estimated_tokens - actual_tokens)
+            bucket["failures"] = 0
+
+    def observe_headers(self, kind: str, headers: Optional[Mapping[str, str]]) -> None:
+        """Syncs the local buckets with the server's `x-ratelimit-remaining-*` headers."""
+        if not headers:
+            return
+        headers = {k.lower(): v for k, v in headers.items()}
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        with self._state() as state:
+            bucket = self._bucket(state, kind, time.time())
+            if remaining_requests is not None:
+                bucket["requests"] = min(bucket["requests"], float(remaining_requests))
+            if remaining_tokens is not None:
+                bucket["tokens"] = min(bucket["tokens"], float(remaining_tokens))
+
+    def on_rate_limited(self, kind: str, headers: Optional[Mapping[str, str]] = None) -> float:
+        """
+        Records a 429 for `kind` and blocks that traffic in every process.
+
+        Returns:
+            The backoff in seconds.
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.time()
+        with self._state() as state:
+            bucket = self._bucket(state, kind, now)
+            bucket["failures"] += 1
+            backoff = (
+                _parse_duration(headers.get("retry-after"))
+                or _parse_duration(headers.get("x-ratelimit-reset-requests"))
+                or min(MAX_BACKOFF_SECONDS, 2.0 ** bucket["failures"])
+            )
+            bucket["blocked_until"] = max(bucket["blocked_until"], now + backoff)
+            bucket["requests"] = 0.0
+        return backoff
+
+    # --- Metrics ---
+
+    def _record_wait(self, kind: str, priority: int, waited: float) -> None:
+        key = (kind, _PRIORITY_NAMES.get(priority, str(priority)))
+        with self._thread_lock:
+            self._waits.setdefault(key, deque(maxlen=1000)).append(waited)
+            totals = self._wait_totals.setdefault(key, [0, 0.0])
+            totals[0] += 1
+            totals[1] += waited
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns queue-wait metrics per "<kind>/<priority>": the number of
+        acquisitions, mean wait, and p95/max wait over the last 1000.
+        """
+        with self._thread_lock:
+            stats = {}
+            for (kind, priority), recent in self._waits.items():
+                ordered = sorted(recent)
+                count, total = self._wait_totals[(kind, priority)]
+                stats[f"{kind}/{priority}"] = {
+                    "acquired": count,
+                    "mean_wait_s": total / count,
+                    "p95_wait_s": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                    "max_wait_s": ordered[-1],
+                }
+            return stats
+
+
+scheduler = RateLimitScheduler()
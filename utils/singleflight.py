@@ -0,0 +1,106 @@
+"""
+singleflight.py
+
+In-flight request coalescing ("single-flight"). Concurrent callers that ask
+for the same key while a call for that key is still running attach to that
+call and receive its result, instead of each issuing their own upstream
+request. Nothing is cached: once the call finishes, the next caller starts a
+fresh one, so results are never stale.
+
+Both threaded and asyncio callers are supported, and they coalesce with each
+other: every in-flight call is tracked by a `concurrent.futures.Future`,
+which threads wait on directly and coroutines await through
+`asyncio.wrap_future`.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one upstream call.
+
+    Attributes:
+        name: A label used when reporting stats.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._upstream_calls = 0
+        self._coalesced_calls = 0
+
+    def _join(self, key: Hashable):
+        """Returns (future, is_leader) for `key`, registering a new call if needed."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._coalesced_calls += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._upstream_calls += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Runs `fn()` unless a call for `key` is already in flight, in which
+        case it waits for that call and returns (or raises) its outcome.
+        """
+        future, is_leader = self._join(key)
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async variant of `do`. The upstream coroutine runs as its own task, so
+        cancelling the caller that started it does not cancel the call for
+        the other callers waiting on it.
+        """
+        future, is_leader = self._join(key)
+        if is_leader:
+            task = asyncio.ensure_future(fn())
+
+            def _on_done(t: asyncio.Task) -> None:
+                if t.cancelled():
+                    self._finish(key, future, error=asyncio.CancelledError())
+                elif t.exception() is not None:
+                    self._finish(key, future, error=t.exception())
+                else:
+                    self._finish(key, future, result=t.result())
+
+            task.add_done_callback(_on_done)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns counters for this flight group.
+
+        `upstream_calls` is the number of calls actually made, and
+        `coalesced_calls` the number of callers that shared one of them.
+        """
+        with self._lock:
+            return {
+                "upstream_calls": self._upstream_calls,
+                "coalesced_calls": self._coalesced_calls,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,1232 @@
+"""
+vector_store.py
+
+A small, pluggable vector-store layer used by both `ingest.py` and
+`retriever.py`. Every backend exposes the same minimal interface
+(`add`, `flush`, `query`, `count`) and returns query results in the same
+shape as ChromaDB (`{'ids': [[...]], 'documents': [[...]], ...}`), so callers
+do not need to know which backend is in use.
+
+Available backends:
+-   "chroma": the original ChromaDB `PersistentClient` store in `db/`.
+-   "mmap":   a compact store that keeps all embeddings in one contiguous
+              float16 or int8-quantized array in a memory-mapped `.npy` file,
+              with a side table for documents and metadata. Exact top-k is
+              computed with batched NumPy matrix products. Opening the store
+              only maps the files, so cold load is near-instant and pages are
+              shared through the OS page cache across worker processes.
+              Ingest publishes new versions as immutable snapshots that
+              readers pick up atomically, so it is the backend to use when
+              serving with several workers (see `serve.py`).
+
+The backend is chosen with the `VECTOR_STORE_BACKEND` environment variable
+(default: "chroma").
+
+Any backend can also be split into several shard collections (see
+`ShardedVectorStore`), selected with `VECTOR_STORE_SHARD_BY`.
+"""
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# --- Constants ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_DIR = os.path.join(ROOT_DIR, 'db')
+MMAP_DB_DIR = os.getenv("MMAP_DB_DIR", os.path.join(ROOT_DIR, 'db_mmap'))
+COLLECTION_NAME = os.getenv("VECTOR_STORE_COLLECTION", "rag_collection")
+# Section and document summaries built by `summarize.py` live in their own collection.
+SUMMARY_COLLECTION_NAME = os.getenv("VECTOR_STORE_SUMMARY_COLLECTION", f"{COLLECTION_NAME}__summaries")
+DEFAULT_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+MMAP_DTYPE = os.getenv("MMAP_VECTOR_DTYPE", "float16")
+# Distance space for new collections: "l2", "cosine" or "ip".
+DISTANCE_SPACE = os.getenv("VECTOR_STORE_SPACE", "l2")
+# HNSW index parameters for new ChromaDB collections (Chroma's defaults).
+# `tune_hnsw.py` sweeps these on the ingested data.
+HNSW_CONFIG = {
+    "M": int(os.getenv("CHROMA_HNSW_M", "16")),
+    "construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "100")),
+    "search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "10")),
+}
+MMAP_QUERY_BATCH_ROWS = 16384
+MMAP_KEEP_SNAPSHOTS = 3
+# Metadata fields with at most this many distinct values are stored as
+# dictionary-encoded columns, so `where` filters on them are vectorized.
+MMAP_MAX_COLUMN_CARDINALITY = 4096
+SHARD_BY = os.getenv("VECTOR_STORE_SHARD_BY", "none")
+SHARD_COUNT = int(os.getenv("VECTOR_STORE_SHARDS", "8"))
+SHARD_QUERY_WORKERS = int(os.getenv("VECTOR_STORE_SHARD_QUERY_WORKERS", "8"))
+# Metadata fields whose per-shard values are tracked for shard pruning.
+SHARD_PRUNE_FIELDS = ("source", "period", "content_type")
+# A record with the flag field `also_in:<source>` set to True also stands for
+# content of that other source (a near-duplicate folded into it at ingest, see
+# `utils/dedup.py`), so source filters must match it too.
+ALSO_IN_PREFIX = "also_in:"
+
+_SUPPORTED_SPACES = ("l2", "cosine", "ip")
+
+
+def also_in_field(source: str) -> str:
+    """The flag field marking records that also stand for content of `source`."""
+    return f"{ALSO_IN_PREFIX}{source}"
+
+
+def source_filter(source: str) -> Dict:
+    """A `where` clause matching records from `source`, including content folded in from it."""
+    return {"$or": [{"source": source}, {also_in_field(source): True}]}
+
+
+class CollectionNotFoundError(ValueError):
+    """Raised when a collection is opened for reading but does not exist."""
+
+
+@contextmanager
+def _exclusive_lock(lock_path: str):
+    """Holds an exclusive advisory lock on `lock_path` (POSIX only)."""
+    try:
+        import fcntl
+    except ImportError:  # Windows: single-writer is the caller's responsibility.
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class VectorStore:
+    """
+    Minimal interface shared by all vector-store backends.
+    """
+
+    backend = "base"
+
+    def add(self, ids: List[str], embeddings: List[List[float]],
+            documents: List[str], metadatas: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persists any buffered writes. A no-op for write-through backends."""
+
+    def bulk_add(self, batches: Iterable[Dict], total: int) -> None:
+        """
+        Adds a stream of batches and persists them. Backends that buffer
+        writes stream the batches to storage instead of holding them all.
+
+        Args:
+            batches: Dicts with "ids", "embeddings", "documents" and "metadatas".
+            total: The number of records in `batches` (an upper bound).
+        """
+        for batch in batches:
+            self.add(batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+        self.flush()
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5,
+              where: Optional[Dict] = None) -> Dict:
+        """
+        Returns the `n_results` nearest neighbours of each query embedding,
+        optionally restricted to records whose metadata matches `where`
+        (ChromaDB filter syntax, e.g. `{"content_type": "table"}`).
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def iter_batches(self, batch_size: int = 5000) -> Iterator[Dict]:
+        """
+        Yields the whole collection in batches of up to `batch_size` records,
+        each a dict with "ids", "embeddings" (float32 array), "documents" and
+        "metadatas".
+        """
+        raise NotImplementedError
+
+    def warm(self) -> None:
+        """Loads the index into memory ahead of the first query, where supported."""
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Thin wrapper around a ChromaDB persistent collection.
+
+    New collections are created with the distance `space` and the HNSW
+    parameters in `hnsw` (keys "M", "construction_ef", "search_ef"),
+    defaulting to `DISTANCE_SPACE` and `HNSW_CONFIG`. Existing collections
+    keep the settings they were built with.
+
+    If the collection is deleted and recreated by another process (as
+    `summarize.py` does when it rebuilds the summary tier), the next call
+    reopens it by name; if it is gone, CollectionNotFoundError is raised.
+    """
+
+    backend = "chroma"
+    default_path = DB_DIR
+
+    def __init__(self, collection_name: str, path: str = DB_DIR, create: bool = False,
+                 space: str = DISTANCE_SPACE, hnsw: Optional[Dict] = None):
+        # Imported lazily so the mmap backend never pays for loading chromadb.
+        import chromadb
+
+        if space not in _SUPPORTED_SPACES:
+            raise ValueError(f"Unsupported distance space '{space}'.")
+        # Opening a client writes `chroma.sqlite3`, so a read-only open of a
+        # directory without one would leave an empty database behind.
+        if not create and not os.path.isfile(os.path.join(path, "chroma.sqlite3")):
+            raise CollectionNotFoundError(f"No ChromaDB database found at '{path}'.")
+
+        self.path = path
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=path)
+        try:
+            self.collection = self.client.get_collection(name=collection_name)
+        except Exception as e:
+            if not create:
+                raise CollectionNotFoundError(f"Collection '{collection_name}' not found.") from e
+            metadata = {"hnsw:space": space}
+            metadata.update({f"hnsw:{key}": value for key, value in (hnsw or HNSW_CONFIG).items()})
+            self.collection = self.client.create_collection(name=collection_name, metadata=metadata)
+
+    def _call(self, method: str, **kwargs):
+        """Calls a collection method, reopening the collection once if it was deleted since it was opened."""
+        from chromadb.errors import NotFoundError
+
+        try:
+            return getattr(self.collection, method)(**kwargs)
+        except NotFoundError:
+            try:
+                self.collection = self.client.get_collection(name=self.collection_name)
+            except Exception as e:
+                raise CollectionNotFoundError(f"Collection '{self.collection_name}' not found.") from e
+            return getattr(self.collection, method)(**kwargs)
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        if isinstance(embeddings, np.ndarray):
+            embeddings = embeddings.tolist()
+        self._call(
+            "add",
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict] = None) -> Dict:
+        kwargs = {"where": where} if where else {}
+        return self._call(
+            "query",
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            **kwargs
+        )
+
+    def count(self) -> int:
+        return self._call("count")
+
+    @staticmethod
+    def delete(collection_name: str, path: str = DB_DIR) -> None:
+        """Deletes a collection and its records, if it exists."""
+        import chromadb
+
+        if not os.path.isfile(os.path.join(path, "chroma.sqlite3")):
+            return
+        try:
+            chromadb.PersistentClient(path=path).delete_collection(name=collection_name)
+        except Exception:
+            pass  # Not found: nothing to delete.
+
+    def iter_batches(self, batch_size: int = 5000) -> Iterator[Dict]:
+        offset = 0
+        while True:
+            batch = self._call(
+                "get",
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            if not batch["ids"]:
+                return
+            yield {
+                "ids": batch["ids"],
+                "embeddings": np.asarray(batch["embeddings"], dtype=np.float32),
+                "documents": batch["documents"],
+                "metadatas": batch["metadatas"],
+            }
+            offset += len(batch["ids"])
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _equals(a, b) -> bool:
+    # Like ChromaDB, booleans never equal numbers (True != 1).
+    return isinstance(a, bool) == isinstance(b, bool) and a == b
+
+
+def _matches(value, operator: str, operand) -> bool:
+    """Evaluates one ChromaDB `where` operator against a metadata value."""
+    if operator == "$eq":
+        return _equals(value, operand)
+    if operator == "$ne":
+        return not _equals(value, operand)
+    if operator == "$in":
+        return any(_equals(value, item) for item in operand)
+    if operator == "$nin":
+        return not any(_equals(value, item) for item in operand)
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        if not (_is_number(value) and _is_number(operand)):
+            return False
+        return {
+            "$gt": value > operand,
+            "$gte": value >= operand,
+            "$lt": value < operand,
+            "$lte": value <= operand,
+        }[operator]
+    raise ValueError(f"Unsupported filter operator '{operator}'.")
+
+
+class _MmapSnapshot:
+    """
+    One immutable, published version of an mmap collection.
+
+    Queries hold a reference to the snapshot they started on, so a concurrent
+    swap to a newer version never changes the arrays under a running query.
+    """
+
+    def __init__(self, directory: Optional[str] = None, version: str = ""):
+        self.version = version
+        self.count = 0
+        self.dtype = MMAP_DTYPE
+        self.space = "l2"
+        self.embeddings = None
+        self.scales = None
+        self.norms = None
+        self.offsets = None
+        self.records = None
+        self.columns: Dict[str, Dict] = {}
+        if directory is None:
+            return
+
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dtype = manifest["dtype"]
+        self.space = manifest["space"]
+        self.count = manifest["count"]
+        if self.count == 0:
+            return
+
+        # mmap_mode='r' maps the files read-only: nothing is copied into the
+        # process heap and the pages are shared with every other reader.
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(directory, "norms.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        if self.dtype == "int8":
+            self.scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")
+
+        with open(os.path.join(directory, "records.jsonl"), "rb") as f:
+            self.records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        for field, column in manifest.get("columns", {}).items():
+            self.columns[field] = {
+                "codes": np.load(os.path.join(directory, column["file"]), mmap_mode="r"),
+                "values": column["values"],
+            }
+
+    def record(self, row: int) -> Dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.records[start:end])
+
+    def dequantize(self, start: int, end: int) -> np.ndarray:
+        block = np.asarray(self.embeddings[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block *= np.asarray(self.scales[start:end], dtype=np.float32)[:, None]
+        return block
+
+    def where_mask(self, where: Dict) -> np.ndarray:
+        """Returns a boolean row mask for a ChromaDB-style metadata filter."""
+        mask = np.ones(self.count, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self.where_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(self.count, dtype=bool)
+                for clause in condition:
+                    any_mask |= self.where_mask(clause)
+                mask &= any_mask
+            else:
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                for operator, operand in condition.items():
+                    mask &= self._operator_mask(key, operator, operand)
+        return mask
+
+    def _operator_mask(self, field: str, operator: str, operand) -> np.ndarray:
+        # The operator is evaluated once per distinct value of the field and
+        # broadcast to rows through the codes. Rows missing the field (code -1,
+        # the last slot) match only the negative operators, as in ChromaDB.
+        values, codes = self._field_column(field)
+        matches = np.zeros(len(values) + 1, dtype=bool)
+        for code, value in enumerate(values):
+            matches[code] = _matches(value, operator, operand)
+        matches[-1] = operator in ("$ne", "$nin")
+        return matches[codes]
+
+    def _field_column(self, field: str):
+        """Returns (distinct values, per-row codes with -1 for missing) for `field`."""
+        column = self.columns.get(field)
+        if column is None:
+            # Unindexed (high-cardinality) field: build the column from the
+            # records once, then reuse it for later queries on this snapshot.
+            lookup: Dict[str, int] = {}
+            codes = np.full(self.count, -1, dtype=np.int32)
+            for row in range(self.count):
+                metadata = self.record(row)["metadata"]
+                if field in metadata:
+                    codes[row] = lookup.setdefault(json.dumps(metadata[field]), len(lookup))
+            column = {"codes": codes, "values": [json.loads(key) for key in lookup]}
+            self.columns[field] = column
+        return column["values"], np.asarray(column["codes"])
+
+
+class _ColumnBuilder:
+    """Builds the dictionary-encoded metadata columns of a snapshot row by row."""
+
+    def __init__(self):
+        self.rows = 0
+        self.lookups: Dict[str, Dict[str, int]] = {}
+        self.codes: Dict[str, array] = {}
+        self.unindexed = set()
+
+    def add(self, metadata: Dict) -> None:
+        for field, value in metadata.items():
+            if field in self.unindexed:
+                continue
+            lookup = self.lookups.setdefault(field, {})
+            codes = self.codes.get(field)
+            if codes is None:
+                codes = self.codes[field] = array("i", [-1]) * self.rows
+            key = json.dumps(value)
+            code = lookup.get(key)
+            if code is None:
+                if len(lookup) >= MMAP_MAX_COLUMN_CARDINALITY:
+                    # Too many distinct values: queries scan the records instead.
+                    self.unindexed.add(field)
+                    del self.codes[field], self.lookups[field]
+                    continue
+                code = lookup[key] = len(lookup)
+            codes.append(code)
+        self.rows += 1
+        for codes in self.codes.values():
+            if len(codes) < self.rows:
+                codes.append(-1)
+
+    def write(self, directory: str) -> Dict[str, Dict]:
+        """Writes one int32 codes file per field and returns the manifest entries."""
+        columns = {}
+        for n, field in enumerate(sorted(self.codes)):
+            file_name = f"column_{n}.npy"
+            np.save(os.path.join(directory, file_name), np.frombuffer(self.codes[field], dtype=np.int32))
+            columns[field] = {"file": file_name, "values": [json.loads(key) for key in self.lookups[field]]}
+        return columns
+
+
+class _SnapshotWriter:
+    """
+    Streams rows into a new snapshot of an mmap collection, holding at most
+    one block in memory. The current snapshot's rows are copied in first, and
+    ids that already exist are skipped, mirroring ChromaDB. The collection's
+    write lock is held from creation until `commit` or `abort`.
+    """
+
+    def __init__(self, store: "MmapVectorStore", max_new_rows: int):
+        self.store = store
+        os.makedirs(store.directory, exist_ok=True)
+        self._lock = ExitStack()
+        self._lock.enter_context(_exclusive_lock(os.path.join(store.directory, ".write.lock")))
+        try:
+            # Another writer may have published since we last looked.
+            store.refresh()
+            base = store._snapshot
+            self.version = f"v{time.time_ns()}"
+            self.tmp_dir = os.path.join(store.directory, f".{self.version}.tmp")
+            os.makedirs(self.tmp_dir)
+            self.capacity = base.count + max_new_rows
+            self.rows = 0
+            self.ids = set()
+            self.embeddings = None
+            self.norms: List[np.ndarray] = []
+            self.scales: List[np.ndarray] = []
+            self.offsets: List[np.ndarray] = [np.zeros(1, dtype=np.int64)]
+            self.record_bytes = 0
+            self.records_file = open(os.path.join(self.tmp_dir, "records.jsonl"), "wb")
+            self.columns = _ColumnBuilder()
+
+            for start in range(0, base.count, MMAP_QUERY_BATCH_ROWS):
+                end = min(start + MMAP_QUERY_BATCH_ROWS, base.count)
+                records = [base.record(row) for row in range(start, end)]
+                self.ids.update(record["id"] for record in records)
+                self._write_rows(base.dequantize(start, end), records)
+            self.base_rows = self.rows
+        except BaseException:
+            self.abort()
+            raise
+
+    def write(self, ids, vectors: np.ndarray, documents, metadatas) -> None:
+        keep, records = [], []
+        for row, chunk_id in enumerate(ids):
+            # Mirror ChromaDB: adding an existing id is ignored.
+            if chunk_id in self.ids:
+                continue
+            self.ids.add(chunk_id)
+            keep.append(row)
+            records.append({"id": chunk_id, "document": documents[row], "metadata": metadatas[row]})
+        if keep:
+            self._write_rows(vectors[keep], records)
+
+    def _write_rows(self, matrix: np.ndarray, records: List[Dict]) -> None:
+        n = len(records)
+        if self.rows + n > self.capacity:
+            raise ValueError(f"Snapshot writer was sized for {self.capacity} rows; got more.")
+        if self.embeddings is None:
+            self.embeddings = np.lib.format.open_memmap(
+                os.path.join(self.tmp_dir, "embeddings.npy"), mode="w+",
+                dtype=np.int8 if self.store.dtype == "int8" else np.float16,
+                shape=(self.capacity, matrix.shape[1]),
+            )
+
+        if self.store.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            stored = np.round(matrix / scales[:, None]).astype(np.int8)
+            self.scales.append(scales.astype(np.float32))
+            norms = np.linalg.norm(stored.astype(np.float32) * scales[:, None], axis=1)
+        else:
+            stored = matrix.astype(np.float16)
+            norms = np.linalg.norm(stored.astype(np.float32), axis=1)
+        self.embeddings[self.rows:self.rows + n] = stored
+        self.norms.append(norms.astype(np.float32))
+
+        lengths = []
+        for record in records:
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            self.records_file.write(line)
+            lengths.append(len(line))
+            self.columns.add(record["metadata"])
+        self.offsets.append(self.record_bytes + np.cumsum(lengths, dtype=np.int64))
+        self.record_bytes += sum(lengths)
+        self.rows += n
+
+    def commit(self) -> bool:
+        """
+        Publishes the snapshot if any rows were added.
+
+        Returns:
+            True if a new snapshot was published.
+        """
+        try:
+            self.records_file.close()
+            if self.rows == self.base_rows:
+                self._discard()
+                return False
+
+            path = os.path.join(self.tmp_dir, "embeddings.npy")
+            self.embeddings.flush()
+            if self.rows < self.capacity:
+                # Skipped duplicate ids left unused rows: copy into an exact-size file.
+                exact = np.lib.format.open_memmap(path + ".exact", mode="w+", dtype=self.embeddings.dtype,
+                                                  shape=(self.rows, self.embeddings.shape[1]))
+                for start in range(0, self.rows, MMAP_QUERY_BATCH_ROWS):
+                    end = min(start + MMAP_QUERY_BATCH_ROWS, self.rows)
+                    exact[start:end] = self.embeddings[start:end]
+                exact.flush()
+                del exact
+                os.replace(path + ".exact", path)
+            dimension = int(self.embeddings.shape[1])
+            self.embeddings = None
+
+            np.save(os.path.join(self.tmp_dir, "norms.npy"), np.concatenate(self.norms))
+            np.save(os.path.join(self.tmp_dir, "offsets.npy"), np.concatenate(self.offsets))
+            if self.scales:
+                np.save(os.path.join(self.tmp_dir, "scales.npy"), np.concatenate(self.scales))
+            manifest = {
+                "dtype": self.store.dtype,
+                "space": self.store.space,
+                "count": self.rows,
+                "dimension": dimension,
+                "columns": self.columns.write(self.tmp_dir),
+            }
+            with open(os.path.join(self.tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+
+            for name in os.listdir(self.tmp_dir):
+                with open(os.path.join(self.tmp_dir, name), "rb") as f:
+                    os.fsync(f.fileno())
+            os.rename(self.tmp_dir, os.path.join(self.store.directory, self.version))
+            self.store._publish(self.version)
+            return True
+        except BaseException:
+            self._discard()
+            raise
+        finally:
+            self._lock.close()
+
+    def abort(self) -> None:
+        """Discards the unpublished snapshot and releases the write lock."""
+        try:
+            self._discard()
+        finally:
+            self._lock.close()
+
+    def _discard(self) -> None:
+        records_file = getattr(self, "records_file", None)
+        if records_file is not None:
+            records_file.close()
+        self.embeddings = None
+        if getattr(self, "tmp_dir", None):
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Memory-mapped, exact-search vector store with atomically published
+    snapshots.
+
+    On-disk layout of `<path>/<collection_name>/`:
+        CURRENT              name of the published snapshot directory
+        v<timestamp>/        one immutable snapshot:
+            manifest.json    dtype, dimension, count and distance space
+            embeddings.npy   (count, dim) float16, or int8 with per-row scales
+            scales.npy       (count,) float32 dequantization scales (int8 only)
+            norms.npy        (count,) float32 L2 norms of the stored vectors
+            records.jsonl    one {"id", "document", "metadata"} object per line
+            offsets.npy      (count + 1,) int64 byte offsets into records.jsonl
+
+    Writes are buffered by `add` and persisted by `flush`, which writes a new
+    snapshot directory and then atomically replaces `CURRENT`. Readers never
+    take locks: before each query they re-read `CURRENT` and, if it changed,
+    map the new snapshot. Older snapshots stay valid for any reader
+    that still has them mapped.
+    """
+
+    backend = "mmap"
+    default_path = MMAP_DB_DIR
+
+    def __init__(self, collection_name: str, path: str = MMAP_DB_DIR, create: bool = False,
+                 dtype: str = MMAP_DTYPE, space: str = DISTANCE_SPACE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported mmap dtype '{dtype}'. Use 'float16' or 'int8'.")
+        if space not in _SUPPORTED_SPACES:
+            raise ValueError(f"Unsupported distance space '{space}'.")
+
+        self.path = path
+        self.collection_name = collection_name
+        self.directory = os.path.join(path, collection_name)
+        self.current_file = os.path.join(self.directory, "CURRENT")
+        self.dtype = dtype
+        self.space = space
+        self._pending: List[tuple] = []
+        self._writer: Optional[_SnapshotWriter] = None
+        self._snapshot = _MmapSnapshot()
+
+        if not os.path.isfile(self.current_file):
+            if not create:
+                raise CollectionNotFoundError(f"Collection '{collection_name}' not found in '{path}'.")
+        else:
+            self.refresh()
+
+    @property
+    def version(self) -> str:
+        """The name of the snapshot this store is currently serving."""
+        return self._snapshot.version
+
+    def refresh(self) -> bool:
+        """
+        Maps the latest published snapshot if `CURRENT` has changed.
+
+        Returns:
+            True if a new snapshot was loaded.
+        """
+        # `CURRENT` is a few bytes; reading it is cheaper and more reliable
+        # than relying on mtime granularity to detect back-to-back publishes.
+        try:
+            with open(self.current_file, "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return False
+        if not version or version == self._snapshot.version:
+            return False
+
+        snapshot = _MmapSnapshot(os.path.join(self.directory, version), version)
+        self._snapshot = snapshot
+        self.dtype = snapshot.dtype
+        self.space = snapshot.space
+        return True
+
+    # --- Writing ---
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        # Buffered as one float32 block per call, so bulk loads never hold
+        # per-row Python lists of floats. During a bulk load the block goes
+        # straight to the snapshot being written.
+        if not len(ids):
+            return
+        block = (list(ids), np.asarray(embeddings, dtype=np.float32), list(documents), list(metadatas))
+        if self._writer is not None:
+            self._writer.write(*block)
+        else:
+            self._pending.append(block)
+
+    def begin_bulk(self, max_rows: int) -> None:
+        """
+        Starts streaming `add` calls into a new snapshot instead of buffering
+        them; `flush` publishes it. Takes the collection's write lock until then.
+
+        Args:
+            max_rows: The most rows that will be added before `flush`.
+        """
+        self.flush()
+        self._writer = _SnapshotWriter(self, max_rows)
+
+    def abort_bulk(self) -> None:
+        """Discards a bulk load started with `begin_bulk`."""
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.abort()
+
+    def bulk_add(self, batches: Iterable[Dict], total: int) -> None:
+        self.begin_bulk(total)
+        try:
+            for batch in batches:
+                self.add(batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+        except BaseException:
+            self.abort_bulk()
+            raise
+        self.flush()
+
+    def flush(self) -> None:
+        if self._writer is None:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            self._writer = _SnapshotWriter(self, sum(len(block[0]) for block in pending))
+            try:
+                for block in pending:
+                    self._writer.write(*block)
+            except BaseException:
+                self.abort_bulk()
+                raise
+
+        writer, self._writer = self._writer, None
+        if writer.commit():
+            self.refresh()
+
+    def _publish(self, version: str) -> None:
+        """Atomically points `CURRENT` at `version` and prunes old snapshots."""
+        tmp_file = self.current_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.current_file)
+
+        # Readers that have an older snapshot mapped keep working after its
+        # files are unlinked, but a few versions are retained so that a slow
+        # reader can still open the snapshot it just read from `CURRENT`.
+        versions = sorted(
+            (name for name in os.listdir(self.directory) if name.startswith("v")),
+            key=lambda name: int(name[1:]),
+        )
+        for name in versions[:-MMAP_KEEP_SNAPSHOTS]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    @staticmethod
+    def delete(collection_name: str, path: str = MMAP_DB_DIR) -> None:
+        """
+        Deletes a collection and all its snapshots, if it exists. Readers that
+        already have a snapshot mapped keep serving it until they next refresh.
+        """
+        directory = os.path.join(path, collection_name)
+        if not os.path.isdir(directory):
+            return
+        # Wait for any in-progress write to publish before removing the files.
+        with _exclusive_lock(os.path.join(directory, ".write.lock")):
+            shutil.rmtree(directory, ignore_errors=True)
+
+    # --- Reading ---
+
+    def count(self) -> int:
+        self.refresh()
+        return self._snapshot.count
+
+    def iter_batches(self, batch_size: int = 5000) -> Iterator[Dict]:
+        self.refresh()
+        snapshot = self._snapshot
+        for start in range(0, snapshot.count, batch_size):
+            end = min(start + batch_size, snapshot.count)
+            records = [snapshot.record(row) for row in range(start, end)]
+            yield {
+                "ids": [record["id"] for record in records],
+                "embeddings": snapshot.dequantize(start, end),
+                "documents": [record["document"] for record in records],
+                "metadatas": [record["metadata"] for record in records],
+            }
+
+    def matching_rows(self, where: Dict) -> np.ndarray:
+        """Returns the row indices in the current snapshot whose metadata matches `where`."""
+        self.refresh()
+        return np.flatnonzero(self._snapshot.where_mask(where))
+
+    def warm(self) -> None:
+        """Reads every page of the current snapshot into the OS page cache."""
+        self.refresh()
+        snapshot = self._snapshot
+        for start in range(0, snapshot.count, MMAP_QUERY_BATCH_ROWS):
+            end = min(start + MMAP_QUERY_BATCH_ROWS, snapshot.count)
+            snapshot.dequantize(start, end)
+            np.asarray(snapshot.norms[start:end]).sum()
+        if snapshot.records is not None:
+            for start in range(0, len(snapshot.records), mmap.PAGESIZE):
+                snapshot.records[start]
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict] = None) -> Dict:
+        self.refresh()
+        snapshot = self._snapshot
+
+        n_queries = len(query_embeddings)
+        empty = {key: [[] for _ in range(n_queries)]
+                 for key in ("ids", "documents", "metadatas", "distances")}
+        if snapshot.count == 0 or n_results <= 0:
+            return empty
+
+        # With a filter, only the matching rows are scanned at all.
+        candidates = np.flatnonzero(snapshot.where_mask(where)) if where else None
+        total = snapshot.count if candidates is None else len(candidates)
+        if total == 0:
+            return empty
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        query_norms = np.linalg.norm(queries, axis=1)
+        k = min(n_results, total)
+
+        best_rows = np.empty((n_queries, 0), dtype=np.int64)
+        best_dist = np.empty((n_queries, 0), dtype=np.float32)
+
+        # Scan the matrix in fixed-size row batches so peak memory stays bounded
+        # regardless of collection size; each batch is one matrix product.
+        for start in range(0, total, MMAP_QUERY_BATCH_ROWS):
+            end = min(start + MMAP_QUERY_BATCH_ROWS, total)
+            if candidates is None:
+                rows = np.arange(start, end, dtype=np.int64)
+                index = slice(start, end)
+            else:
+                rows = candidates[start:end]
+                index = rows
+            block = np.asarray(snapshot.embeddings[index], dtype=np.float32)
+            dots = queries @ block.T
+            if snapshot.scales is not None:
+                dots *= np.asarray(snapshot.scales[index], dtype=np.float32)[None, :]
+            norms = np.asarray(snapshot.norms[index], dtype=np.float32)
+
+            if snapshot.space == "l2":
+                dist = norms[None, :] ** 2 - 2.0 * dots + query_norms[:, None] ** 2
+            elif snapshot.space == "cosine":
+                denom = np.maximum(norms[None, :] * query_norms[:, None], 1e-12)
+                dist = 1.0 - dots / denom
+            else:
+                dist = 1.0 - dots
+
+            cand_dist = np.concatenate([best_dist, dist], axis=1)
+            cand_rows = np.concatenate([best_rows, np.broadcast_to(rows, dist.shape)], axis=1)
+            keep = min(k, cand_dist.shape[1])
+            top = np.argpartition(cand_dist, keep - 1, axis=1)[:, :keep]
+            best_dist = np.take_along_axis(cand_dist, top, axis=1)
+            best_rows = np.take_along_axis(cand_rows, top, axis=1)
+
+        order = np.argsort(best_dist, axis=1)
+        best_dist = np.take_along_axis(best_dist, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q in range(n_queries):
+            records = [snapshot.record(int(row)) for row in best_rows[q]]
+            results["ids"].append([r["id"] for r in records])
+            results["documents"].append([r["document"] for r in records])
+            results["metadatas"].append([r["metadata"] for r in records])
+            results["distances"].append([float(d) for d in best_dist[q]])
+        return results
+
+
+def _allowed_values(condition) -> Optional[list]:
+    """Returns the values a `where` condition can match, or None if unknown."""
+    if isinstance(condition, dict):
+        if set(condition) - {"$eq", "$in"}:
+            return None
+        allowed = list(condition.get("$in", []))
+        if "$eq" in condition:
+            allowed.append(condition["$eq"])
+        return allowed
+    return [condition]
+
+
+def _shard_may_match(fields: Dict[str, list], where: Optional[Dict]) -> bool:
+    """False only if no record in a shard with these field values can match `where`."""
+    for key, condition in (where or {}).items():
+        if key == "$and":
+            if not all(_shard_may_match(fields, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_shard_may_match(fields, clause) for clause in condition):
+                return False
+        elif key.startswith(ALSO_IN_PREFIX):
+            # The registry lists such a record's alternate sources under "source".
+            if condition in (True, {"$eq": True}) and key[len(ALSO_IN_PREFIX):] not in fields.get("source", []):
+                return False
+        elif key in SHARD_PRUNE_FIELDS:
+            allowed = _allowed_values(condition)
+            if allowed is not None and not any(value in fields.get(key, []) for value in allowed):
+                return False
+    return True
+
+
+_query_pool = None
+_query_pool_pid = None
+
+
+def _get_query_pool() -> ThreadPoolExecutor:
+    """Returns this process's shard query pool (threads do not survive a fork)."""
+    global _query_pool, _query_pool_pid
+    if _query_pool is None or _query_pool_pid != os.getpid():
+        _query_pool = ThreadPoolExecutor(max_workers=SHARD_QUERY_WORKERS, thread_name_prefix="shard-query")
+        _query_pool_pid = os.getpid()
+    return _query_pool
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    Splits one logical collection across several shard collections of an
+    underlying backend and queries them with scatter-gather.
+
+    Records are routed to a shard according to `shard_by`:
+        "source": one shard per source file
+        "period": one shard per reporting period (e.g. "3Q2023")
+        "hash":   `n_shards` shards by a stable hash of the record id
+
+    The shards and the distinct values of `SHARD_PRUNE_FIELDS` they contain
+    are recorded in `<path>/<collection_name>.shards.json`. A query skips
+    every shard whose values cannot satisfy its `where` filter, searches the
+    remaining shards concurrently and merges their top-k by distance.
+    """
+
+    def __init__(self, collection_name: str, backend: str = DEFAULT_BACKEND, path: Optional[str] = None,
+                 create: bool = False, shard_by: str = SHARD_BY, n_shards: int = SHARD_COUNT, **store_kwargs):
+        if backend not in _BACKENDS:
+            raise ValueError(f"Unknown vector store backend '{backend}'.")
+
+        self.backend = backend
+        self.store_cls = _BACKENDS[backend]
+        self.path = path or self.store_cls.default_path
+        self.collection_name = collection_name
+        self.registry_file = os.path.join(self.path, f"{collection_name}.shards.json")
+        self.store_kwargs = store_kwargs
+        self._lock = threading.Lock()
+        self._stores: Dict[str, VectorStore] = {}
+        self._bulk_rows: Optional[int] = None
+
+        if os.path.isfile(self.registry_file):
+            self._registry = self._read_registry()
+            if create and shard_by != "none" and shard_by != self._registry["shard_by"]:
+                raise ValueError(
+                    f"Collection '{collection_name}' is sharded by '{self._registry['shard_by']}', not "
+                    f"'{shard_by}'. Delete it before re-ingesting with a different shard strategy."
+                )
+        elif create:
+            if shard_by not in ("source", "period", "hash"):
+                raise ValueError(f"Unsupported shard strategy '{shard_by}'. Use 'source', 'period' or 'hash'.")
+            self._registry = {"shard_by": shard_by, "n_shards": n_shards, "shards": {}}
+        else:
+            raise CollectionNotFoundError(f"Sharded collection '{collection_name}' not found in '{self.path}'.")
+
+        self.shard_by = self._registry["shard_by"]
+        self.n_shards = self._registry["n_shards"]
+
+    # --- Registry ---
+
+    def _read_registry(self) -> Dict:
+        with open(self.registry_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_registry(self) -> None:
+        """Merges this store's shards into the registry file and replaces it atomically."""
+        os.makedirs(self.path, exist_ok=True)
+        with _exclusive_lock(self.registry_file + ".lock"):
+            registry = self._read_registry() if os.path.isfile(self.registry_file) else dict(self._registry, shards={})
+            with self._lock:
+                for key, info in self._registry["shards"].items():
+                    merged = registry["shards"].setdefault(key, {"collection": info["collection"], "fields": {}})
+                    for field, values in info["fields"].items():
+                        known = merged["fields"].setdefault(field, [])
+                        known.extend(v for v in values if v not in known)
+                    if key in self._stores:
+                        merged["count"] = self._stores[key].count()
+                self._registry = registry
+
+            tmp_file = self.registry_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(registry, f, indent=2)
+            os.replace(tmp_file, self.registry_file)
+
+    def _shard_collection_name(self, key: str) -> str:
+        # Collection names must be short and alphanumeric-ish for ChromaDB;
+        # the hash suffix keeps distinct keys distinct after slugging.
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "-", key).strip("-_")[:32] or "shard"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+        return f"{self.collection_name}__{slug}-{digest}"
+
+    def shard_for(self, chunk_id: str, metadata: Dict) -> str:
+        """Returns the shard key a record belongs to."""
+        if self.shard_by == "hash":
+            return str(int(hashlib.sha1(chunk_id.encode("utf-8")).hexdigest(), 16) % self.n_shards)
+        return str(metadata.get(self.shard_by, "unknown"))
+
+    def _shard_store(self, key: str, create: bool = False) -> VectorStore:
+        with self._lock:
+            if key not in self._stores:
+                info = self._registry["shards"].get(key)
+                name = info["collection"] if info else self._shard_collection_name(key)
+                store = self.store_cls(name, path=self.path, create=create, **self.store_kwargs)
+                if self._bulk_rows is not None and hasattr(store, "begin_bulk"):
+                    store.begin_bulk(self._bulk_rows)
+                self._stores[key] = store
+            return self._stores[key]
+
+    # --- Writing ---
+
+    def add(self, ids, embeddings, documents, metadatas) -> None:
+        groups: Dict[str, List[int]] = {}
+        for i, (chunk_id, metadata) in enumerate(zip(ids, metadatas)):
+            groups.setdefault(self.shard_for(chunk_id, metadata), []).append(i)
+
+        for key, rows in groups.items():
+            store = self._shard_store(key, create=True)
+            store.add(
+                ids=[ids[i] for i in rows],
+                embeddings=embeddings[rows] if isinstance(embeddings, np.ndarray) else [embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+            with self._lock:
+                info = self._registry["shards"].setdefault(
+                    key, {"collection": self._shard_collection_name(key), "fields": {}}
+                )
+                for field in SHARD_PRUNE_FIELDS:
+                    known = info["fields"].setdefault(field, [])
+                    for i in rows:
+                        value = metadatas[i].get(field)
+                        if value is not None and value not in known:
+                            known.append(value)
+                # Sources folded into a record count as sources of its shard,
+                # so a source filter does not prune the shard that holds them.
+                known = info["fields"]["source"]
+                for i in rows:
+                    for field, value in metadatas[i].items():
+                        source = field[len(ALSO_IN_PREFIX):]
+                        if field.startswith(ALSO_IN_PREFIX) and value is True and source not in known:
+                            known.append(source)
+
+    def bulk_add(self, batches: Iterable[Dict], total: int) -> None:
+        """Streams batches into every shard that supports it (see `MmapVectorStore.begin_bulk`)."""
+        with self._lock:
+            self._bulk_rows = total
+            stores = list(self._stores.values())
+        try:
+            for store in stores:
+                if hasattr(store, "begin_bulk"):
+                    store.begin_bulk(total)
+            for batch in batches:
+                self.add(batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+        except BaseException:
+            with self._lock:
+                self._bulk_rows = None
+                stores = list(self._stores.values())
+            for store in stores:
+                if hasattr(store, "abort_bulk"):
+                    store.abort_bulk()
+            raise
+        with self._lock:
+            self._bulk_rows = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Flushes every shard in parallel, then publishes the registry."""
+        with self._lock:
+            stores = list(self._stores.values())
+        with ThreadPoolExecutor(max_workers=max(1, min(SHARD_QUERY_WORKERS, len(stores)))) as pool:
+            list(pool.map(lambda store: store.flush(), stores))
+        self._write_registry()
+
+    @staticmethod
+    def delete(collection_name: str, backend: str = DEFAULT_BACKEND, path: Optional[str] = None) -> None:
+        """Deletes every shard of a sharded collection, then its registry."""
+        store_cls = _BACKENDS[backend]
+        path = path or store_cls.default_path
+        registry_file = os.path.join(path, f"{collection_name}.shards.json")
+        if not os.path.isfile(registry_file):
+            return
+        with _exclusive_lock(registry_file + ".lock"):
+            with open(registry_file, "r", encoding="utf-8") as f:
+                registry = json.load(f)
+            for info in registry["shards"].values():
+                store_cls.delete(info["collection"], path=path)
+            os.remove(registry_file)
+
+    # --- Reading ---
+
+    @property
+    def version(self) -> Dict[str, str]:
+        """The snapshot version of each open shard, for backends that have one."""
+        with self._lock:
+            return {key: getattr(store, "version", None) for key, store in self._stores.items()}
+
+    def _refresh_registry(self) -> None:
+        # The registry is small; re-reading it picks up shards added by ingest.
+        if os.path.isfile(self.registry_file):
+            registry = self._read_registry()
+            with self._lock:
+                self._registry = registry
+
+    def count(self) -> int:
+        self._refresh_registry()
+        return sum(self._shard_store(key).count() for key in list(self._registry["shards"]))
+
+    def iter_batches(self, batch_size: int = 5000) -> Iterator[Dict]:
+        self._refresh_registry()
+        for key in list(self._registry["shards"]):
+            yield from self._shard_store(key).iter_batches(batch_size)
+
+    def warm(self) -> None:
+        self._refresh_registry()
+        for key in list(self._registry["shards"]):
+            self._shard_store(key).warm()
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict] = None) -> Dict:
+        self._refresh_registry()
+        targets = [
+            key for key, info in self._registry["shards"].items()
+            if _shard_may_match(info["fields"], where)
+        ]
+
+        def _query_shard(key: str) -> Optional[Dict]:
+            try:
+                return self._shard_store(key).query(query_embeddings, n_results, where)
+            except CollectionNotFoundError:
+                return None
+
+        results = [r for r in _get_query_pool().map(_query_shard, targets) if r]
+
+        merged = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q in range(len(query_embeddings)):
+            hits = []
+            for result in results:
+                hits.extend(zip(
+                    result["distances"][q], result["ids"][q],
+                    result["documents"][q], result["metadatas"][q],
+                ))
+            hits = heapq.nsmallest(n_results, hits, key=lambda hit: hit[0])
+            merged["distances"].append([hit[0] for hit in hits])
+            merged["ids"].append([hit[1] for hit in hits])
+            merged["documents"].append([hit[2] for hit in hits])
+            merged["metadatas"].append([hit[3] for hit in hits])
+        return merged
+
+
+_BACKENDS = {
+    "chroma": ChromaVectorStore,
+    "mmap": MmapVectorStore,
+}
+
+_open_stores: Dict[tuple, VectorStore] = {}
+
+
+def get_vector_store(collection_name: str = COLLECTION_NAME, backend: Optional[str] = None,
+                     path: Optional[str] = None, create: bool = False) -> VectorStore:
+    """
+    Returns a vector store for the given collection.
+
+    If the collection was ingested with sharding (or `create` is True and
+    `VECTOR_STORE_SHARD_BY` is set), a `ShardedVectorStore` over the chosen
+    backend is returned; otherwise a single collection.
+
+    Read-only stores (`create=False`) are cached per process, so repeated
+    queries do not pay the cost of reopening the index.
+
+    Args:
+        collection_name: The name of the collection to open.
+        backend: "chroma" or "mmap". Defaults to `VECTOR_STORE_BACKEND`.
+        path: Storage directory. Defaults to the backend's standard location.
+        create: Create the collection if it does not exist (used by ingest).
+
+    Returns:
+        A `VectorStore` instance.
+
+    Raises:
+        CollectionNotFoundError: If `create` is False and the collection
+            does not exist.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown vector store backend '{backend}'. Choose from {sorted(_BACKENDS)}.")
+
+    store_cls = _BACKENDS[backend]
+    root = path or store_cls.default_path
+    sharded = (
+        os.path.isfile(os.path.join(root, f"{collection_name}.shards.json"))
+        or (create and SHARD_BY != "none")
+    )
+
+    def _open() -> VectorStore:
+        if sharded:
+            return ShardedVectorStore(collection_name, backend=backend, path=root, create=create)
+        return store_cls(collection_name, path=root, create=create)
+
+    if create:
+        return _open()
+
+    key = (backend, root, collection_name)
+    if key not in _open_stores:
+        _open_stores[key] = _open()
+    return _open_stores[key]
+
+
+def delete_collection(collection_name: str, backend: Optional[str] = None, path: Optional[str] = None) -> None:
+    """
+    Deletes a collection (every shard, if it is sharded) and drops it from the
+    per-process store cache. Deleting a collection that does not exist is a no-op.
+
+    Args:
+        collection_name: The name of the collection to delete.
+        backend: "chroma" or "mmap". Defaults to `VECTOR_STORE_BACKEND`.
+        path: Storage directory. Defaults to the backend's standard location.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown vector store backend '{backend}'. Choose from {sorted(_BACKENDS)}.")
+
+    store_cls = _BACKENDS[backend]
+    root = path or store_cls.default_path
+    ShardedVectorStore.delete(collection_name, backend=backend, path=root)
+    store_cls.delete(collection_name, path=root)
+    _open_stores.pop((backend, root, collection_name), None)